@@ -0,0 +1,168 @@
+import os
+import mmap
+import struct
+import shutil
+from DungeonCache import levelKey,jobKey
+from DungeonGrid import Grid
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+#Layout, little endian:
+#  header  'DGAR' magic, uint32 version, height, width and level count, padded to HEADER_SIZE bytes
+#  index   count entries of a 32 byte sha256 levelKey digest and a uint32 slot, sorted by digest
+#  data    from the first PAGE boundary after the index, one Grid.pack() level of stride bytes per slot
+MAGIC = b'DGAR'
+VERSION = 1
+HEADER = struct.Struct('<4sIIII')
+HEADER_SIZE = 32
+ENTRY = struct.Struct('<32sI')
+PAGE = 4096
+
+def strideOf(h,w):
+    return h*((w+7)//8)
+
+def dataOffset(count):
+    return -(-(HEADER_SIZE + count*ENTRY.size)//PAGE)*PAGE
+
+class ArchiveWriter:
+    '''Writes an archive of equally sized levels. Levels are spooled to a side file as they come and the sorted index
+    is put in front of them on close(), so only the index is held in memory.'''
+    def __init__(self,path,h,w):
+        self.path = path
+        self.h = h
+        self.w = w
+        self.stride = strideOf(h,w)
+        self.slots = {}  #Key digest -> slot.
+        self.spool = open(path+'.data','wb')
+
+    def add(self,key,packed):
+        '''Adds a level, bit-packed as by Grid.pack(), under a levelKey hex digest. A key already added is skipped.'''
+        if len(packed) != self.stride:
+            raise ValueError(f"Packed level is {len(packed)} bytes, the archive holds {self.h}x{self.w} levels of {self.stride}.")
+        digest = bytes.fromhex(key)
+        if digest in self.slots: return
+        self.slots[digest] = len(self.slots)
+        self.spool.write(packed)
+
+    def addLevel(self,generator,seed,level,**params):
+        self.add(levelKey(generator,seed,self.h,self.w,params),level.pack())
+
+    def addResult(self,result):
+        '''Adds a DungeonBatch MapResult.'''
+        self.add(jobKey(result.seed,result.params),result.data)
+
+    def close(self):
+        self.spool.close()
+        temp = self.path+'.tmp'
+        with open(temp,'wb') as file:
+            file.write(HEADER.pack(MAGIC,VERSION,self.h,self.w,len(self.slots)).ljust(HEADER_SIZE,b'\0'))
+            for digest in sorted(self.slots):
+                file.write(ENTRY.pack(digest,self.slots[digest]))
+            file.write(bytes(dataOffset(len(self.slots)) - file.tell()))
+            with open(self.path+'.data','rb') as spool:
+                shutil.copyfileobj(spool,file)
+        os.replace(temp,self.path)
+        os.remove(self.path+'.data')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+def writeArchive(path,results):
+    '''Writes MapResults, all of the same size, to an archive and returns how many levels it holds.'''
+    writer = None
+    for result in results:
+        if writer is None: writer = ArchiveWriter(path,result.h,result.w)
+        writer.addResult(result)
+    if writer is None:
+        raise ValueError("No levels to archive.")
+    writer.close()
+    return len(writer.slots)
+
+class Archive:
+    '''Read-only, memory mapped archive. Opening only reads the header; lookups binary search the index in place and
+    levels are handed out as zero-copy memoryviews of the mapping. Release those views before close().'''
+    def __init__(self,path):
+        self.path = path
+        with open(path,'rb') as file:
+            self.map = mmap.mmap(file.fileno(),0,access=mmap.ACCESS_READ)
+        magic,version,self.h,self.w,self.count = HEADER.unpack_from(self.map)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a level archive.")
+        if version != VERSION:
+            raise ValueError(f"{path} is archive version {version}, only version {VERSION} is supported.")
+        self.stride = strideOf(self.h,self.w)
+        self.data = dataOffset(self.count)
+
+    def __len__(self):
+        return self.count
+
+    def slotOf(self,key):
+        '''Slot of a levelKey hex digest, or -1.'''
+        digest = bytes.fromhex(key)
+        low,high = 0,self.count
+        while low < high:
+            middle = (low+high)//2
+            offset = HEADER_SIZE + middle*ENTRY.size
+            found = self.map[offset:offset+32]
+            if found == digest: return ENTRY.unpack_from(self.map,offset)[1]
+            if found < digest: low = middle+1
+            else: high = middle
+        return -1
+
+    def __contains__(self,key):
+        return self.slotOf(key) >= 0
+
+    def packed(self,slot):
+        '''Zero-copy memoryview of the bit-packed level in a slot.'''
+        if not 0 <= slot < self.count:
+            raise IndexError(slot)
+        start = self.data + slot*self.stride
+        return memoryview(self.map)[start:start+self.stride]
+
+    def bits(self,slot):
+        '''Zero-copy (h,(w+7)//8) uint8 numpy view of the packed level in a slot; np.unpackbits(bits,axis=1,count=w) unpacks it.'''
+        if np is None:
+            raise RuntimeError("Archive.bits requires numpy to be installed.")
+        return np.frombuffer(self.packed(slot),dtype=np.uint8).reshape(self.h,(self.w+7)//8)
+
+    def level(self,slot):
+        return Grid.fromPacked(self.packed(slot),self.h,self.w)
+
+    def __getitem__(self,key):
+        '''The level stored under a levelKey hex digest, as a fresh Grid.'''
+        slot = self.slotOf(key)
+        if slot < 0: raise KeyError(key)
+        return self.level(slot)
+
+    def get(self,generator,seed,**params):
+        '''The level for these settings as a fresh Grid, or None if the archive does not hold it.'''
+        slot = self.slotOf(levelKey(generator,seed,self.h,self.w,params))
+        return None if slot < 0 else self.level(slot)
+
+    def close(self):
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from DungeonBatch import generateBatch
+    path = sys.argv[1] if len(sys.argv) > 1 else 'caves.dgar'
+    start = time.perf_counter()
+    count = writeArchive(path,generateBatch(range(16),{'h':512,'w':512,'useNumpy':np is not None}))
+    print(f"Archived {count} levels to {path} ({os.path.getsize(path)/2**20:.1f} MiB) in {time.perf_counter()-start:.2f}s")
+    start = time.perf_counter()
+    with Archive(path) as archive:
+        level = archive.get('AutomaticCell',7)
+        print(f"Opened and read one level in {(time.perf_counter()-start)*1000:.2f}ms")
@@ -0,0 +1,85 @@
+import os
+from collections import namedtuple
+from DungeonGen import NewCellAuto,CellularAutomata
+from DungeonGen3 import AutomaticCell
+from DungeonGrid import Grid,unpackLevel
+
+MapResult = namedtuple('MapResult','seed params h w data')
+GENERATORS = ('AutomaticCell','NewCellAuto','CellularAutomata')
+
+def newGenerator(generator,seed=None,h=1,w=1):
+    if generator == 'AutomaticCell': return AutomaticCell(h,w,seed)
+    if generator == 'NewCellAuto': return NewCellAuto(seed)
+    if generator == 'CellularAutomata': return CellularAutomata(seed)
+    raise ValueError(f"Unknown generator '{generator}'.")
+
+def settingsOf(generator,params):
+    '''Every tunable of a generator by name, defaults included, after applying params.'''
+    settings = newGenerator(generator).configure(**params)
+    return {name:getattr(settings,name) for name in settings.PARAMS}
+
+def checkSize(generator,h,w):
+    '''Raises ValueError for a map size the generator cannot make. NewCellAuto and CellularAutomata mix up height and width
+    in places, so they only make square maps.'''
+    if generator in ('NewCellAuto','CellularAutomata') and h != w:
+        raise ValueError(f"{generator} only generates square maps, got {h}x{w}.")
+
+def buildLevel(generator,seed,h,w,params,stats=None):
+    '''Runs a generator by name and returns its level as an h x w Grid, walls set.'''
+    checkSize(generator,h,w)
+    cell = newGenerator(generator,seed,h,w).configure(**params)
+    if generator == 'AutomaticCell':
+        return cell.GENERATE(stats)
+    if generator == 'NewCellAuto':
+        return cell.generateLevel(w,h,stats)
+    cell.verbose = False
+    #CellularAutomata indexes its level [x][y].
+    return Grid.fromRows(zip(*cell.generateLevel(w,h,stats)))
+
+def generateOne(job):
+    '''Generates a single map from a (seed,params) job. params holds h, w, optionally a generator name (AutomaticCell by default) and its tunables.'''
+    seed,params = job
+    tunables = dict(params)
+    h,w = tunables.pop('h'),tunables.pop('w')
+    generator = tunables.pop('generator','AutomaticCell')
+    return MapResult(seed,params,h,w,buildLevel(generator,seed,h,w,tunables).pack())
+
+def makeJobs(seeds,params):
+    '''Pairs every seed with its parameter set. params is either one dict shared by all seeds, or a list with one dict per seed.'''
+    seeds = list(seeds)
+    if isinstance(params,dict):
+        params = [params]*len(seeds)
+    params = list(params)
+    if len(params) != len(seeds):
+        raise ValueError(f"Got {len(params)} parameter sets for {len(seeds)} seeds.")
+    return list(zip(seeds,params))
+
+def generateBatch(seeds,params,workers=None,ordered=False,chunksize=1):
+    '''Generates one map per seed over a process pool, yielding MapResults as they finish.
+    Every map uses its own random.Random(seed), so a seed always gives the same map whichever worker runs it.
+    Set ordered to get results back in seed order instead of completion order.'''
+    jobs = makeJobs(seeds,params)
+    for _,job in jobs:
+        checkSize(job.get('generator','AutomaticCell'),job['h'],job['w'])
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        yield from map(generateOne,jobs)
+        return
+    from multiprocessing import Pool
+    with Pool(min(workers,len(jobs)) or 1) as pool:
+        results = pool.imap(generateOne,jobs,chunksize) if ordered else pool.imap_unordered(generateOne,jobs,chunksize)
+        yield from results
+
+def levelOf(result):
+    '''Unpacks a MapResult back into a list of rows of bools.'''
+    return unpackLevel(result.data,result.h,result.w)
+
+
+if __name__ == "__main__":
+    import time
+    start = time.perf_counter()
+    count = 0
+    for result in generateBatch(range(16),{'h':200,'w':200}):
+        count += 1
+    elapsed = time.perf_counter() - start
+    print(f"{count} maps in {elapsed:.2f}s ({count/elapsed:.1f} maps/s)")
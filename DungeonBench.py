@@ -0,0 +1,126 @@
+import sys
+import json
+import platform
+import argparse
+import tracemalloc
+import subprocess
+from DungeonBatch import buildLevel
+from DungeonStats import GenerationStats
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SEEDS = (1,2,3)
+QUICK_SIZES = (64,128,256)
+FULL_SIZES = (64,128,256,512,1024,2048,4096)
+CASES = {
+    'AutomaticCell':('AutomaticCell',{}),
+    'AutomaticCell-numpy':('AutomaticCell',{'useNumpy':True}),
+    'AutomaticCell-spanning':('AutomaticCell',{'useNumpy':True,'connectMode':'spanning'}),
+    'AutomaticCell-planned':('AutomaticCell',{'useNumpy':True,'connectMode':'planned'}),
+    'NewCellAuto':('NewCellAuto',{}),
+    'CellularAutomata':('CellularAutomata',{}),
+}
+#Parameter sweep, run on AutomaticCell-numpy at SWEEP_SIZE.
+SWEEP_SIZE = 128
+SWEEP = [{'initLive':initLive,'sims':sims} for initLive in (0.35,0.40,0.45) for sims in (6,8,10)]
+
+def measure(case,size,params=None,seeds=SEEDS,repeat=3):
+    '''Times one benchmark case over the fixed seeds, keeping the best of repeat runs, then traces peak memory in one extra run.'''
+    generator,tunables = CASES[case]
+    tunables = dict(tunables,**(params or {}))
+    best = None
+    for _ in range(repeat):
+        stats = GenerationStats()
+        for seed in seeds:
+            buildLevel(generator,seed,size,size,tunables,stats)
+        if best is None or stats.seconds < best.seconds: best = stats
+    tracemalloc.start()
+    for seed in seeds:
+        buildLevel(generator,seed,size,size,tunables)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'case':case,'size':size,'params':params or {},'seconds':best.seconds,
+            'phases':{name:total['seconds'] for name,total in best.byPhase().items()},
+            'peakBytes':peak,'cellsPerSecond':size*size*len(seeds)/best.seconds}
+
+def resultKey(result):
+    return json.dumps([result['case'],result['size'],result['params']],sort_keys=True)
+
+def compare(results,baseline,threshold):
+    '''Returns (result, baseline result) pairs whose time grew by more than threshold (0.1 is 10%).'''
+    previous = {resultKey(result):result for result in baseline['results']}
+    return [(result,previous[resultKey(result)]) for result in results
+            if resultKey(result) in previous and result['seconds'] > previous[resultKey(result)]['seconds']*(1+threshold)]
+
+def commit():
+    try:
+        return subprocess.run(['git','rev-parse','HEAD'],capture_output=True,text=True,check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def run(cases,sizes,sweep=True,seeds=SEEDS,repeat=3,log=print):
+    results = []
+    for case in cases:
+        if CASES[case][1].get('useNumpy') and np is None:
+            log(f"skipping {case}: numpy is not installed")
+            continue
+        for size in sizes:
+            results.append(measure(case,size,seeds=seeds,repeat=repeat))
+            log(formatResult(results[-1]))
+    if sweep and np is not None:
+        for params in SWEEP:
+            results.append(measure('AutomaticCell-numpy',SWEEP_SIZE,params,seeds,repeat))
+            log(formatResult(results[-1]))
+    return {'commit':commit(),'python':platform.python_version(),'numpy':np.__version__ if np else None,
+            'seeds':list(seeds),'repeat':repeat,'results':results}
+
+def scaling(size,maxThreads,seeds=SEEDS,repeat=3,log=print):
+    '''Times AutomaticCell-numpy at one size with 1 to maxThreads row stripe threads.'''
+    results = []
+    for threads in range(1,maxThreads+1):
+        results.append(measure('AutomaticCell-numpy',size,{'threads':threads},seeds,repeat))
+        log(f"{formatResult(results[-1])}  speedup {results[0]['seconds']/results[-1]['seconds']:.2f}x")
+    return results
+
+def formatResult(result):
+    params = ' '.join(f"{k}={v}" for k,v in result['params'].items())
+    phases = ' '.join(f"{k}={v:.3f}" for k,v in result['phases'].items())
+    return (f"{result['case']:<24}{result['size']:>5}² {result['seconds']:9.3f}s {result['cellsPerSecond']:>12,.0f} cells/s "
+            f"{result['peakBytes']/2**20:8.1f} MiB  {params}  [{phases}]")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks the dungeon generators over fixed seeds.')
+    parser.add_argument('--cases',default=','.join(CASES),help='comma separated cases, from: '+', '.join(CASES))
+    parser.add_argument('--sizes',default=','.join(map(str,QUICK_SIZES)),help='comma separated map sizes')
+    parser.add_argument('--full',action='store_true',help='sweep every size from 64 to 4096')
+    parser.add_argument('--no-sweep',action='store_true',help='skip the AutomaticCell parameter sweep')
+    parser.add_argument('--repeat',type=int,default=3)
+    parser.add_argument('--output',default='bench_results.json')
+    parser.add_argument('--compare',help='earlier results file to check for regressions')
+    parser.add_argument('--threshold',type=float,default=0.10,help='allowed slowdown against --compare, 0.10 is 10%%')
+    parser.add_argument('--scaling',type=int,metavar='N',help='only time AutomaticCell-numpy with 1 to N threads')
+    parser.add_argument('--scaling-size',type=int,default=2048,help='map size for --scaling')
+    args = parser.parse_args()
+
+    cases = args.cases.split(',')
+    for case in cases:
+        if case not in CASES: parser.error(f"unknown case '{case}'")
+    sizes = FULL_SIZES if args.full else tuple(int(size) for size in args.sizes.split(','))
+    if args.scaling:
+        if np is None: parser.error("--scaling needs numpy")
+        report = {'commit':commit(),'python':platform.python_version(),'numpy':np.__version__,'seeds':list(SEEDS),
+                  'repeat':args.repeat,'results':scaling(args.scaling_size,args.scaling,repeat=args.repeat)}
+    else:
+        report = run(cases,sizes,not args.no_sweep,repeat=args.repeat)
+    with open(args.output,'w') as file:
+        json.dump(report,file,indent=1)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report['results'],json.load(file),args.threshold)
+        for result,previous in regressions:
+            print(f"REGRESSION {result['case']} {result['size']}² {result['params']}: {previous['seconds']:.3f}s -> {result['seconds']:.3f}s")
+        if regressions: sys.exit(1)
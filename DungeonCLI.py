@@ -0,0 +1,162 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+
+#Modules timed by the timing command, in dependency order.
+MODULES = ('DungeonGrid','DungeonGen3','DungeonGen','DungeonBatch','DungeonExport')
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def demo(args):
+    '''Generates one level and shows it, or saves it with --output. --debug colors the caves and marks their walls.'''
+    from DungeonBatch import newGenerator,buildLevel,checkSize
+    from DungeonStats import GenerationStats
+    from DungeonExport import toImage
+    try:
+        checkSize(args.generator,args.height,args.width)
+    except ValueError as error:
+        raise SystemExit(f"error: {error}")
+    stats = GenerationStats(traceMemory=args.debug)
+    if args.generator != 'AutomaticCell' or not args.debug:
+        level = buildLevel(args.generator,args.seed,args.height,args.width,{},stats)
+        image = toImage(level)
+    else:
+        from PIL import ImageDraw
+        from DungeonGen3 import CaveIndex,labelCaves
+        cell = newGenerator('AutomaticCell',args.seed,args.height,args.width)
+        level = cell.GENERATE(stats)
+        index = CaveIndex(*labelCaves(level,args.height,args.width,cell.minCave),args.height,args.width,cell.isWall)
+        image = toImage(level,index.labels).convert('RGB')
+        draw = ImageDraw.Draw(image)
+        draw.point([(i%args.width,i//args.width) for i in index.boundary],(255,0,0))
+        draw.point([(i%args.width,i//args.width) for i in index.spawn],(0,255,0))
+        draw.point((cell.center.x,cell.center.y),(0,0,255))
+        center = index.caveAt(cell.center)
+        print(f"Center Cave: {center if center >= 0 else 'NONE'}")
+        print(f"Largest Cave: {index.largest()} ({max(index.area,default=0)} tiles)")
+    print(stats.report())
+    if args.output: image.save(args.output)
+    else: image.show()
+
+def timeIn(code,repeat):
+    '''Best of repeat runs of code in a fresh interpreter, which prints the seconds it measured.'''
+    times = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable,'-c',code],capture_output=True,text=True,cwd=HERE)
+        if result.returncode:
+            raise RuntimeError(f"Timing run failed:\n{result.stderr}")
+        times.append(float(result.stdout))
+    return min(times)
+
+def timing(args):
+    '''Measures cold import time of every module, and import plus first generation, each in a fresh interpreter.'''
+    for module in MODULES:
+        seconds = timeIn(f"import time\nstart = time.perf_counter()\nimport {module}\nprint(time.perf_counter()-start)",args.repeat)
+        print(f"import {module:<16}{seconds*1000:9.1f} ms")
+    for generator in ('AutomaticCell','NewCellAuto','CellularAutomata'):
+        code = (f"import time\nstart = time.perf_counter()\nfrom DungeonBatch import buildLevel\n"
+                f"buildLevel({generator!r},1,{args.size},{args.size},{{}})\nprint(time.perf_counter()-start)")
+        print(f"first {generator:<17}{timeIn(code,args.repeat)*1000:9.1f} ms  ({args.size}x{args.size}, import included)")
+    loaded = subprocess.run([sys.executable,'-c',"import sys,DungeonBatch\nprint(' '.join(sorted(m for m in ('PIL','bresenham','numpy') if m in sys.modules)))"],
+                            capture_output=True,text=True,cwd=HERE).stdout.strip()
+    print(f"optional modules loaded by DungeonBatch: {loaded or 'none'}")
+
+def flag(value):
+    '''argparse type for bool tunables.'''
+    if value.lower() in ('1','true','yes','on'): return True
+    if value.lower() in ('0','false','no','off'): return False
+    raise argparse.ArgumentTypeError(f"expected true or false, got '{value}'")
+
+def tunables():
+    '''(name, default, generators) for every tunable of every generator, in PARAMS order.'''
+    from DungeonBatch import GENERATORS,newGenerator
+    found = {}
+    for generator in GENERATORS:
+        defaults = newGenerator(generator)
+        for name in defaults.PARAMS:
+            found.setdefault(name,[getattr(defaults,name),[]])[1].append(generator)
+    return [(name,default,generators) for name,(default,generators) in found.items()]
+
+def batch(args):
+    '''Generates count maps from consecutive seeds over a process pool, writing each one as it arrives.'''
+    from DungeonBatch import generateBatch,settingsOf,checkSize
+    from DungeonGrid import Grid
+    params = {name:getattr(args,name) for name,_,_ in tunables() if getattr(args,name) is not None}
+    params.update(h=args.height or args.size,w=args.width or args.size)
+    try:
+        settingsOf(args.generator,{k:v for k,v in params.items() if k not in ('h','w')})
+        checkSize(args.generator,params['h'],params['w'])
+    except ValueError as error:
+        raise SystemExit(f"error: {error}")
+    params['generator'] = args.generator
+    seeds = range(args.seed,args.seed+args.count)
+    writer = None
+    if args.archive:
+        from DungeonArchive import ArchiveWriter
+        writer = ArchiveWriter(args.archive,params['h'],params['w'])
+    elif args.output:
+        import DungeonExport
+        os.makedirs(args.output,exist_ok=True)
+        save,extension = {'png':(DungeonExport.savePNG,'png'),'npy':(DungeonExport.saveNpy,'npy'),'packed':(DungeonExport.savePacked,'dgbp')}[args.format]
+    start = last = time.perf_counter()
+    done = 0
+    for result in generateBatch(seeds,params,args.workers,chunksize=args.chunksize):
+        if writer:
+            writer.addResult(result)
+        elif args.output:
+            save(Grid.fromPacked(result.data,result.h,result.w),os.path.join(args.output,f"{args.generator}_{result.seed}.{extension}"))
+        done += 1
+        now = time.perf_counter()
+        if args.progress and (now-last >= args.progress or done == args.count):
+            last = now
+            print(f"{done}/{args.count} maps  {done/(now-start):.2f} maps/s",file=sys.stderr)
+    if writer: writer.close()
+    elapsed = time.perf_counter()-start
+    cells = done*params['h']*params['w']
+    print(f"{done} {params['h']}x{params['w']} {args.generator} maps in {elapsed:.2f}s: "
+          f"{done/elapsed:.2f} maps/s, {cells/elapsed:,.0f} cells/s")
+
+def parser():
+    parser = argparse.ArgumentParser(description='Dungeon generator command line.')
+    commands = parser.add_subparsers(dest='command',required=True)
+    show = commands.add_parser('demo',help='generate one level and show it')
+    show.add_argument('--generator',default='AutomaticCell',choices=('AutomaticCell','NewCellAuto','CellularAutomata'))
+    show.add_argument('--height',type=int,default=200)
+    show.add_argument('--width',type=int,default=200)
+    show.add_argument('--seed',type=int,help='random seed, the global random module is used without one')
+    show.add_argument('--debug',action='store_true',help='color caves, mark cave walls, spawn tiles and the center, and trace memory')
+    show.add_argument('--output',help='save the image here instead of showing it')
+    show.set_defaults(run=demo)
+    times = commands.add_parser('timing',help='measure cold import and first generation latency')
+    times.add_argument('--size',type=int,default=128)
+    times.add_argument('--repeat',type=int,default=3)
+    times.set_defaults(run=timing)
+    many = commands.add_parser('batch',help='generate many maps in parallel and write them out',
+                               description='Generates --count maps from seeds --seed, --seed+1, ... over worker processes.')
+    many.add_argument('--generator',default='AutomaticCell',choices=('AutomaticCell','NewCellAuto','CellularAutomata'))
+    many.add_argument('--size',type=int,default=200,help='map height and width, unless --height or --width is given')
+    many.add_argument('--height',type=int,help='AutomaticCell only, the other generators make square maps')
+    many.add_argument('--width',type=int,help='AutomaticCell only, the other generators make square maps')
+    many.add_argument('--count',type=int,default=16)
+    many.add_argument('--seed',type=int,default=0,help='first seed')
+    many.add_argument('--workers',type=int,help='worker processes, one per CPU by default')
+    many.add_argument('--chunksize',type=int,default=1,help='maps handed to a worker at a time')
+    output = many.add_mutually_exclusive_group()
+    output.add_argument('--output',help='directory to write one file per map to')
+    output.add_argument('--archive',help='DungeonArchive file to write the maps to')
+    many.add_argument('--format',default='png',choices=('png','npy','packed'),help='file format for --output')
+    many.add_argument('--progress',type=float,default=1.0,help='seconds between progress lines, 0 for none')
+    for name,default,generators in tunables():
+        many.add_argument('--'+name,dest=name,type=flag if isinstance(default,bool) else type(default),
+                          help=f"{generators[0]} tunable, default {default}" if len(generators) == 1 else f"{', '.join(generators)} tunable")
+    many.set_defaults(run=batch)
+    return parser
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import os
+import json
+import zlib
+import hashlib
+from collections import OrderedDict
+from DungeonBatch import buildLevel,settingsOf
+from DungeonGrid import Grid
+
+#Tunables that only change how a level is computed, not what it looks like.
+NEUTRAL_PARAMS = ('useNumpy','incremental','distances','threads')
+
+def levelKey(generator,seed,h,w,params):
+    '''Canonical hash of everything that decides a level: generator, seed, size and every tunable, defaults included.
+    An unseeded level draws from the global random module, so nothing decides it and it has no key.'''
+    if seed is None:
+        raise ValueError("Unseeded levels have no level key, pass a seed.")
+    tunables = {name:value for name,value in settingsOf(generator,params).items() if name not in NEUTRAL_PARAMS}
+    canonical = json.dumps([generator,seed,h,w,tunables],sort_keys=True,separators=(',',':'))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def jobKey(seed,params):
+    '''levelKey of a (seed,params) job as DungeonBatch.generateOne takes it.'''
+    tunables = dict(params)
+    h,w = tunables.pop('h'),tunables.pop('w')
+    generator = tunables.pop('generator','AutomaticCell')
+    return levelKey(generator,seed,h,w,tunables)
+
+class LevelCache:
+    '''LRU cache of generated levels, held bit-packed in memory up to maxBytes.
+    With a directory, levels are also written there zlib-compressed and read back when they fall out of memory.'''
+    def __init__(self,maxBytes=64*2**20,directory=None):
+        self.maxBytes = maxBytes
+        self.directory = directory
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.diskHits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory: os.makedirs(directory,exist_ok=True)
+
+    def generate(self,generator,seed,h,w,**params):
+        '''Returns the level for these settings as a fresh Grid, generating it only if it is not cached.
+        Unseeded levels differ every time, so they are always generated and never cached.'''
+        if seed is None:
+            self.misses += 1
+            return buildLevel(generator,seed,h,w,params)
+        key = levelKey(generator,seed,h,w,params)
+        packed = self.entries.get(key)
+        if packed is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return Grid.fromPacked(packed,h,w)
+        packed = self.load(key)
+        if packed is not None:
+            self.diskHits += 1
+        else:
+            self.misses += 1
+            packed = buildLevel(generator,seed,h,w,params).pack()
+            self.save(key,packed)
+        self.remember(key,packed)
+        return Grid.fromPacked(packed,h,w)
+
+    def remember(self,key,packed):
+        if len(packed) > self.maxBytes: return
+        self.entries[key] = packed
+        self.bytes += len(packed)
+        while self.bytes > self.maxBytes:
+            _,evicted = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+            self.evictions += 1
+
+    def path(self,key):
+        return os.path.join(self.directory,key+'.bin')
+
+    def load(self,key):
+        if not self.directory or not os.path.exists(self.path(key)): return None
+        with open(self.path(key),'rb') as file:
+            return zlib.decompress(file.read())
+
+    def save(self,key,packed):
+        if not self.directory: return
+        temp = self.path(key)+'.tmp'
+        with open(temp,'wb') as file:
+            file.write(zlib.compress(packed))
+        os.replace(temp,self.path(key))
+
+    def clear(self):
+        '''Empties the in-memory cache. Files on disk are kept.'''
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {'hits':self.hits,'diskHits':self.diskHits,'misses':self.misses,'evictions':self.evictions,
+                'entries':len(self.entries),'bytes':self.bytes}
@@ -0,0 +1,102 @@
+import os
+import struct
+import colorsys
+from array import array
+from DungeonGrid import Grid,asGrid
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+OPEN = (255,255,255)
+WALL = (0,0,0)
+CAVE_COLORS = 254  #Palette entries left for caves once open and wall are taken.
+PACKED_MAGIC = b'DGBP'
+#PIL is only imported by the functions that build images, so the .npy and packed writers work without it.
+
+def cavePalette():
+    '''Palette with open cells white at index 0, walls black at 1, and well spread cave colors after them.'''
+    palette = list(OPEN + WALL)
+    for i in range(CAVE_COLORS):
+        r,g,b = colorsys.hsv_to_rgb((i*0.618033988749895) % 1,0.65,0.95)
+        palette += [int(r*255),int(g*255),int(b*255)]
+    return palette
+
+def paletteIndices(level,labels=None,top=0,bottom=None):
+    '''Palette index of every cell in rows top to bottom, as bytes: 0 open, 1 wall, 2+ cave number when labels are given.'''
+    bottom = level.h if bottom is None else bottom
+    cells = memoryview(level.buffer)[top*level.w:bottom*level.w]
+    if labels is None:
+        return cells
+    caves = memoryview(labels)[top*level.w:bottom*level.w]
+    if np is not None:
+        walls = np.frombuffer(cells,dtype=np.uint8).astype(bool)
+        caves = np.frombuffer(caves,dtype=np.int32)
+        return np.where(walls,1,np.where(caves >= 0,2 + caves % CAVE_COLORS,0)).astype(np.uint8).tobytes()
+    return bytes(1 if wall else (2 + cave % CAVE_COLORS if cave >= 0 else 0) for wall,cave in zip(cells,caves))
+
+def toImage(level,labels=None):
+    '''Builds a palette image straight from the level buffer. labels, a flat cave label grid such as AutomaticCell.labels,
+    colors each cave.'''
+    from PIL import Image
+    level = asGrid(level)
+    image = Image.frombytes('P',(level.w,level.h),bytes(paletteIndices(level,labels)))
+    image.putpalette(cavePalette())
+    return image
+
+def savePNG(level,path,labels=None):
+    toImage(level,labels).save(path,'PNG')
+
+def saveTiles(level,directory,tileSize=1024,labels=None):
+    '''Writes a very large level as tileSize square PNGs named tile_<row>_<column>.png, one band of rows at a time.'''
+    from PIL import Image
+    level = asGrid(level)
+    os.makedirs(directory,exist_ok=True)
+    palette = cavePalette()
+    paths = []
+    for top in range(0,level.h,tileSize):
+        bottom = min(level.h,top+tileSize)
+        band = Image.frombytes('P',(level.w,bottom-top),bytes(paletteIndices(level,labels,top,bottom)))
+        for left in range(0,level.w,tileSize):
+            tile = band.crop((left,0,min(level.w,left+tileSize),bottom-top))
+            tile.putpalette(palette)
+            paths.append(os.path.join(directory,f"tile_{top//tileSize}_{left//tileSize}.png"))
+            tile.save(paths[-1],'PNG')
+    return paths
+
+def npyHeader(descr,shape):
+    header = repr({'descr':descr,'fortran_order':False,'shape':shape}).encode('latin1')
+    padding = 64 - (10 + len(header) + 1) % 64
+    header += b' '*padding + b'\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H',len(header)) + header
+
+def saveNpy(level,path):
+    '''Writes the level as an (h,w) uint8 .npy file, straight from its buffer. numpy is not needed.'''
+    level = asGrid(level)
+    with open(path,'wb') as file:
+        file.write(npyHeader('|u1',(level.h,level.w)))
+        file.write(level.buffer)
+
+def saveLabelsNpy(labels,h,w,path):
+    '''Writes a flat cave label grid as an (h,w) int32 .npy file.'''
+    labels = array('i',labels)
+    if labels.itemsize != 4:
+        raise RuntimeError("Labels must be 32 bit integers.")
+    with open(path,'wb') as file:
+        file.write(npyHeader('<i4',(h,w)))
+        file.write(labels.tobytes())
+
+def savePacked(level,path):
+    '''Writes the level one bit per cell: a 'DGBP' magic, little endian uint32 height and width, then Grid.pack() rows.'''
+    level = asGrid(level)
+    with open(path,'wb') as file:
+        file.write(PACKED_MAGIC + struct.pack('<II',level.h,level.w))
+        file.write(level.pack())
+
+def loadPacked(path):
+    with open(path,'rb') as file:
+        data = file.read()
+    if data[:4] != PACKED_MAGIC:
+        raise ValueError(f"{path} is not a packed level file.")
+    h,w = struct.unpack('<II',data[4:12])
+    return Grid.fromPacked(data[12:],h,w)
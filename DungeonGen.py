@@ -1,12 +1,61 @@
 import random
 import math
-from PIL import Image,ImageDraw
+from array import array
+from contextlib import nullcontext
+from DungeonGrid import Grid
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 WIDTH = 200
 HEIGHT = 200
 
+class SiteCounts:
+    '''Wall counts around sites of a level for random-site update loops. A site's count is computed on its first visit and
+    then kept current as cells flip, so later visits cost O(1) instead of a neighborhood scan.
+    offsets are the (dx,dy) cells a site counts, count(x,y) computes a site's count from scratch.'''
+    def __init__(self,width,height,offsets,count):
+        self.width = width
+        self.height = height
+        self.offsets = [(dx,dy,dy*width+dx) for dx,dy in offsets]
+        self.count = count
+        self.values = array('b',[-1])*(width*height)
+
+    def prefill(self,level):
+        '''Computes every site's count at once from an (height,width) numpy array of walls, for the offsets that are in bounds.
+        Out of bounds cells add nothing, so sites that count them must still be set with count().'''
+        padded = np.pad(level.astype(np.int8),2)
+        total = np.zeros((self.height,self.width),dtype=np.int8)
+        for dx,dy,_ in self.offsets:
+            total += padded[2+dy:2+dy+self.height,2+dx:2+dx+self.width]
+        self.values = array('b',total.tobytes())
+
+    def get(self,x,y):
+        i = y*self.width+x
+        if self.values[i] < 0:
+            self.values[i] = self.count(x,y)
+        return self.values[i]
+
+    def flipped(self,x,y,step):
+        '''Updates the visited sites that count cell (x,y) after it gained (step=1) or lost (step=-1) a wall.'''
+        values,width,height = self.values,self.width,self.height
+        cell = y*width+x
+        for dx,dy,offset in self.offsets:
+            if 0 <= x-dx < width and 0 <= y-dy < height and values[cell-offset] >= 0:
+                values[cell-offset] += step
+
+#Cells NewCellAuto.wallsWithin counts in bounds: off the site's own row and column.
+OFF_AXIS_1 = [(dx,dy) for dy in (-1,1) for dx in (-1,1)]
+OFF_AXIS_2 = [(dx,dy) for dy in (-2,-1,1,2) for dx in (-2,-1,1,2)]
+#Cells CellularAutomata.getAdjacentWalls counts.
+ADJACENT = [(dx,dy) for dy in (-1,0,1) for dx in (-1,0,1) if dx or dy]
+
 class NewCellAuto:
-    def __init__(self):
+    PARAMS = ('genOneIter','genTwoIter','rOneNeighbors','rTwoNeighbors','wallProbability','MIN_SIZE')
+
+    def __init__(self,seed=None):
+        self.rng = random if seed is None else random.Random(seed) #Levels with a seed get their own generator, otherwise the global random module is used.
         self.level = []
         self.caves = []
         self.width = 0
@@ -19,15 +68,29 @@ class NewCellAuto:
         self.wallProbability = 0.51
         self.MIN_SIZE = 15
 
-    def generateLevel(self,mapWidth,mapHeight):
+    def configure(self,**params):
+        '''Sets tunables by name, e.g. configure(genOneIter=400).'''
+        for name,value in params.items():
+            if name not in self.PARAMS:
+                raise ValueError(f"Unknown NewCellAuto parameter '{name}'.")
+            setattr(self,name,value)
+        return self
+
+    def generateLevel(self,mapWidth,mapHeight,stats=None):
+        '''Performs level generation. Pass a GenerationStats to record wall time for every phase.'''
         self.width = mapWidth
         self.height = mapHeight
-
-        self.level = [[1 for x in range(mapWidth)] for y in range(mapHeight)]
-        self.randomFillMap()
-        self.createCaves()
-        self.getCaves()
-        self.cleanup()
+        phase = stats.phase if stats else nullcontext
+
+        self.level = Grid(mapHeight,mapWidth,1)
+        with phase('randomFillMap'):
+            self.randomFillMap()
+        with phase('createCaves'):
+            self.createCaves()
+        with phase('getCaves'):
+            self.getCaves()
+        with phase('cleanup'):
+            self.cleanup()
         
         return self.level
         
@@ -35,7 +98,7 @@ class NewCellAuto:
         #STEP 1: Generate random postions.
         for y in range (1,self.height-1):
             for x in range (1,self.width-1):
-                if random.random() > self.wallProbability:
+                if self.rng.random() > self.wallProbability:
                     self.level[y][x] = 0
 
     def wallsWithin(self,pX,pY,r=1):
@@ -61,20 +124,36 @@ class NewCellAuto:
 
     def createCaves(self):
         #STEP 2: Automata the positions to create caves.
+        #wallsWithin results are kept in SiteCounts, updated on every flip, instead of being rescanned up to four times per site.
+        near = SiteCounts(self.width,self.height,OFF_AXIS_1,lambda x,y: self.wallsWithin(x,y))
+        far = SiteCounts(self.width,self.height,OFF_AXIS_2,lambda x,y: self.wallsWithin(x,y,2))
+        if np is not None:
+            near.prefill(self.level.asArray())
+            far.prefill(self.level.asArray())
+            #Sites are never closer than one tile to the edge, so only the radius 2 counts of the second row in reach the outside.
+            for x in range(1,self.width-1):
+                for y in (1,self.height-2): far.values[y*self.width+x] = self.wallsWithin(x,y,2)
+            for y in range(1,self.height-1):
+                for x in (1,self.width-2): far.values[y*self.width+x] = self.wallsWithin(x,y,2)
+        def setCell(x,y,wall):
+            if self.level[y][x] != wall:
+                self.level[y][x] = wall
+                near.flipped(x,y,1 if wall else -1)
+                far.flipped(x,y,1 if wall else -1)
         for _ in range (self.genOneIter): 
             #Buffer one tile around the edges of the map
-            x,y = random.randint(1,self.width-2),random.randint(1,self.height-2)
+            x,y = self.rng.randint(1,self.width-2),self.rng.randint(1,self.height-2)
             # if the cell's neighboring walls > self.neighbors, set it to 1
-            if self.wallsWithin(x,y) < self.rOneNeighbors or self.wallsWithin(x,y,2) < self.rTwoNeighbors:
-                self.level[y][x] = 1
-            elif self.wallsWithin(x,y) > self.rOneNeighbors or self.wallsWithin(x,y,2) > self.rTwoNeighbors:
-                self.level[y][x] = 0
+            if near.get(x,y) < self.rOneNeighbors or far.get(x,y) < self.rTwoNeighbors:
+                setCell(x,y,1)
+            elif near.get(x,y) > self.rOneNeighbors or far.get(x,y) > self.rTwoNeighbors:
+                setCell(x,y,0)
         for _ in range(self.genTwoIter):
-            x,y = random.randint(1,self.width-2),random.randint(1,self.height-2)
-            if self.wallsWithin(x,y) > self.rOneNeighbors:
-                self.level[y][x] = 1
-            elif self.wallsWithin(x,y) < self.rOneNeighbors:
-                self.level[y][x] = 0
+            x,y = self.rng.randint(1,self.width-2),self.rng.randint(1,self.height-2)
+            if near.get(x,y) > self.rOneNeighbors:
+                setCell(x,y,1)
+            elif near.get(x,y) < self.rOneNeighbors:
+                setCell(x,y,0)
 
     def getCaves(self):
         # locate all the caves within self.level and store them in self.caves
@@ -124,7 +203,10 @@ class NewCellAuto:
     
 
 class CellularAutomata:
-    def __init__(self):
+    PARAMS = ('iterations','neighbors','wallProbability','ROOM_MIN_SIZE','ROOM_MAX_SIZE','smoothEdges','smoothing')
+
+    def __init__(self,seed=None):
+        self.rng = random if seed is None else random.Random(seed) #Levels with a seed get their own generator, otherwise the global random module is used.
         self.level = []
         self.iterations = 30000
         
@@ -136,47 +218,68 @@ class CellularAutomata:
         
         self.smoothEdges = True
         self.smoothing =  1
+        self.verbose = True # print progress while generating
+
+    def configure(self,**params):
+        '''Sets tunables by name, e.g. configure(iterations=50000).'''
+        for name,value in params.items():
+            if name not in self.PARAMS:
+                raise ValueError(f"Unknown CellularAutomata parameter '{name}'.")
+            setattr(self,name,value)
+        return self
 
-    def generateLevel(self, mapWidth, mapHeight):
+    def generateLevel(self, mapWidth, mapHeight, stats=None):
         self.caves = []
         self.level = [[1 for y in range(mapHeight)] for x in range(mapWidth)]
+        phase = stats.phase if stats else nullcontext
 
-        print("Filling map!")
-        self.randomFillMap(mapWidth,mapHeight)
+        if self.verbose: print("Filling map!")
+        with phase('randomFillMap'):
+            self.randomFillMap(mapWidth,mapHeight)
         
-        print("Generating caves!")
-        self.createCaves(mapWidth,mapHeight)
+        if self.verbose: print("Generating caves!")
+        with phase('createCaves'):
+            self.createCaves(mapWidth,mapHeight)
 
-        print("Getting caves!")
-        self.getCaves(mapWidth,mapHeight)
+        if self.verbose: print("Getting caves!")
+        with phase('getCaves'):
+            self.getCaves(mapWidth,mapHeight)
 
         #print("Connecting caves!")
         #self.connectCaves(mapWidth,mapHeight)
 
-        print("Cleaning up!")
-        self.cleanUpMap(mapWidth,mapHeight)
+        if self.verbose: print("Cleaning up!")
+        with phase('cleanUpMap'):
+            self.cleanUpMap(mapWidth,mapHeight)
 
         return self.level
 
     def randomFillMap(self,mapWidth,mapHeight):
         for y in range (1,mapHeight-1):
             for x in range (1,mapWidth-1):
-                if random.random() >= self.wallProbability:
+                if self.rng.random() >= self.wallProbability:
                     self.level[y][x] = 0
 
     def createCaves(self,mapWidth,mapHeight):
         # ==== Create distinct caves ====
+        # getAdjacentWalls results are kept in SiteCounts and updated on every flip
+        adjacent = SiteCounts(mapWidth,mapHeight,ADJACENT,self.getAdjacentWalls)
+        if np is not None: adjacent.prefill(np.array(self.level).T)
         for i in range (0,self.iterations): #pylint: disable=unused-variable
             # Pick a random point with a buffer around the edges of the map
-            tileX = random.randint(1,mapWidth-2) #(2,mapWidth-3)
-            tileY = random.randint(1,mapHeight-2) #(2,mapHeight-3)
+            tileX = self.rng.randint(1,mapWidth-2) #(2,mapWidth-3)
+            tileY = self.rng.randint(1,mapHeight-2) #(2,mapHeight-3)
 
             # if the cell's neighboring walls > self.neighbors, set it to 1
-            if self.getAdjacentWalls(tileX,tileY) > self.neighbors:
-                self.level[tileX][tileY] = 1
+            if adjacent.get(tileX,tileY) > self.neighbors:
+                wall = 1
             # or set it to 0
-            elif self.getAdjacentWalls(tileX,tileY) < self.neighbors:
-                self.level[tileX][tileY] = 0
+            elif adjacent.get(tileX,tileY) < self.neighbors:
+                wall = 0
+            else: continue
+            if self.level[tileX][tileY] != wall:
+                self.level[tileX][tileY] = wall
+                adjacent.flipped(tileX,tileY,1 if wall else -1)
 
         # ==== Clean Up Map ====
         self.cleanUpMap(mapWidth,mapHeight)
@@ -221,7 +324,7 @@ class CellularAutomata:
             west /= total
 
             # choose the direction
-            choice = random.random()
+            choice = self.rng.random()
             if 0 <= choice < north:
                 dx = 0
                 dy = -1
@@ -253,6 +356,14 @@ class CellularAutomata:
                         wallCounter += 1
         return wallCounter
 
+    def getAdjacentWallsSimple(self, x, y): # finds the walls in four directions
+        wallCounter = 0
+        if (self.level[x][y-1] == 1): wallCounter += 1 # check north
+        if (self.level[x][y+1] == 1): wallCounter += 1 # check south
+        if (self.level[x-1][y] == 1): wallCounter += 1 # check west
+        if (self.level[x+1][y] == 1): wallCounter += 1 # check east
+        return wallCounter
+
     def getCaves(self, mapWidth, mapHeight):
         # locate all the caves within self.level and store them in self.caves
         for x in range (0,mapWidth):
@@ -353,17 +464,6 @@ class CellularAutomata:
         else: return False
 
 
-#level = CellularAutomata().generateLevel(WIDTH,HEIGHT)
-level = NewCellAuto().generateLevel(WIDTH,HEIGHT)
-
-I = Image.new('1',(WIDTH,HEIGHT),1)
-iD = ImageDraw.Draw(I)
-
-walls = []
-for y,row in enumerate(level):
-    for x,wall in enumerate(row):
-        if wall == 1:
-            walls.append((x,y))
-
-iD.point(walls,0)
-I.show()
\ No newline at end of file
+if __name__ == "__main__":
+    from DungeonCLI import main
+    main(['demo','--generator','NewCellAuto','--height',str(HEIGHT),'--width',str(WIDTH)])
@@ -1,13 +1,23 @@
 import random
-from PIL import Image,ImageDraw
+import heapq
+import itertools
+from array import array
+from collections.abc import Mapping,Sequence
+from contextlib import nullcontext
 from collections import namedtuple
-from bresenham import bresenham
-import time
+from DungeonGrid import Grid
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 DEBUG = False
 WIDTH = 200
 HEIGHT = 200
+SETTLE_PASSES = 4  #Most whole-array passes orthogonalSettle makes before the cells still off are fixed one at a time.
 Tile = namedtuple('Tile','y x')
+ConnectionReport = namedtuple('ConnectionReport','corridors groups probes')
+Frame = namedtuple('Frame','stage level changed')
 
 SQ_DIST = lambda a,b: (b.x-a.x)**2 + (b.y-a.y)**2
 TRANSPOSE = lambda a: Tile(a[1],a[0])
@@ -16,15 +26,516 @@ FLATTEN = lambda l: [item for sublist in l for item in sublist]
 
 #random.seed('DOG')
 
+def labelCaves(level,h,w,minCave,fill=False):
+    '''Labels the 8-connected open areas of a level with two-pass union-find.
+    Returns a flat int32 label grid (indexed y*w+x) where walls and areas smaller than minCave are -1 and caves are numbered in scan order, and the size of each cave.
+    With fill, areas smaller than minCave are also turned into walls by the second pass.'''
+    labels = array('i',[-1])*(h*w)
+    parent = array('i')
+    counts = array('i')
+    def find(label):
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+    def union(a,b):
+        a,b = find(a),find(b)
+        if b < a: a,b = b,a
+        parent[b] = a
+        return a
+    #First pass: provisional labels, merging with the already visited W, NW, N and NE neighbors.
+    for y in range(h):
+        row = level[y]
+        base = y*w
+        for x in range(w):
+            if row[x]: continue
+            i = base+x
+            label = labels[i-1] if x > 0 else -1
+            if y > 0:
+                for n in range(i-w-1 if x > 0 else i-w,i-w+2 if x < w-1 else i-w+1):
+                    other = labels[n]
+                    if other >= 0:
+                        label = other if label < 0 else union(label,other)
+            if label < 0:
+                label = len(parent)
+                parent.append(label)
+                counts.append(0)
+            labels[i] = label
+            counts[label] += 1
+    #Roots are always the smallest provisional label of an area, so numbering them in order keeps caves in scan order.
+    sizes = array('i',[0])*len(parent)
+    for label in range(len(parent)):
+        sizes[find(label)] += counts[label]
+    caveIds = array('i',[-1])*len(parent)
+    caveSizes = array('i')
+    for label in range(len(parent)):
+        if parent[label] == label and sizes[label] >= minCave:
+            caveIds[label] = len(caveSizes)
+            caveSizes.append(sizes[label])
+        else:
+            caveIds[label] = caveIds[find(label)]
+    #Second pass: resolve every cell to its final cave index.
+    if np is not None:
+        flat = np.frombuffer(labels,dtype=np.int32)
+        opened = flat >= 0
+        flat[opened] = np.frombuffer(caveIds,dtype=np.int32)[flat[opened]]
+        if fill and isinstance(level,Grid):
+            level.asArray().reshape(-1)[opened & (flat < 0)] = 1
+            fill = False
+    else:
+        for i,label in enumerate(labels):
+            if label >= 0: labels[i] = caveIds[label]
+    if fill and len(caveSizes) < len(parent):
+        for i,label in enumerate(labels):
+            if label < 0 and not level[i//w][i%w]: level[i//w][i%w] = True
+    return labels,caveSizes
+
+def joinRuns(count,a,b):
+    '''Connected components of count runs joined by the pairs a[k],b[k], as whole-array passes: every component ends up
+    labeled with its smallest run. Each round hooks the larger root of every pair still apart under the smaller one and
+    then points every run straight at its root.'''
+    roots = np.arange(count,dtype=np.int64)
+    while len(a):
+        ra,rb = roots[a],roots[b]
+        low = np.minimum(ra,rb)
+        np.minimum.at(roots,ra,low)
+        np.minimum.at(roots,rb,low)
+        while True:
+            jumped = roots[roots]
+            if np.array_equal(jumped,roots): break
+            roots = jumped
+        apart = roots[a] != roots[b]
+        a,b = a[apart],b[apart]
+    return roots
+
+def rowLinks(upper,lower):
+    '''(a,b) pairs of runs touching, 8-connected, between rows of run numbers (-1 for walls) and the rows right below them.'''
+    w = upper.shape[-1]
+    a,b = [],[]
+    for shift in (-1,0,1):
+        below = lower[...,max(0,-shift):w-max(0,shift)]
+        above = upper[...,max(0,shift):w-max(0,-shift)]
+        linked = (below >= 0) & (above >= 0)
+        a.append(below[linked])
+        b.append(above[linked])
+    return np.concatenate(a),np.concatenate(b)
+
+def labelCavesArray(level,h,w,minCave,fill=False,runStripes=None):
+    '''labelCaves for a Grid with numpy, giving the same labels and sizes. Open cells are grouped into horizontal runs and
+    the runs of every stripe of rows are joined with whole-array passes, on runStripes(kernel) (kernel(top,bottom) for
+    stripes covering the level, as AutomaticCell.runStripes) when given; runs meeting across stripe borders are then
+    merged with union-find, which only sees one row pair per border.'''
+    if np is None:
+        raise RuntimeError("labelCavesArray requires numpy to be installed.")
+    runStripes = runStripes or (lambda kernel: [kernel(0,h)])
+    cells = level.asArray()
+    runs = np.empty((h,w),dtype=np.int64)
+    def stripeRuns(top,bottom):
+        opened = cells[top:bottom] == 0
+        starts = opened.copy()
+        starts[:,1:] &= ~opened[:,:-1]
+        run = runs[top:bottom]
+        np.cumsum(starts.reshape(-1),out=run.reshape(-1))
+        run -= 1
+        run[~opened] = -1
+        count = int(run.max(initial=-1))+1
+        a,b = rowLinks(run[:-1],run[1:])
+        lengths = np.bincount(run[opened],minlength=count)
+        return count,joinRuns(count,a,b),lengths
+    stripes = runStripes(stripeRuns)
+    bounds = [h*k//len(stripes) for k in range(len(stripes)+1)]
+    offsets = np.cumsum([0]+[count for count,_,_ in stripes])
+    total = int(offsets[-1])
+    root = np.concatenate([roots+offset for (_,roots,_),offset in zip(stripes,offsets)]) if total else np.empty(0,dtype=np.int64)
+    lengths = np.concatenate([lengths for _,_,lengths in stripes]) if total else np.empty(0,dtype=np.int64)
+    #Runs meeting across a stripe border: shift both rows to global run numbers and join their roots.
+    a,b = [np.empty(0,dtype=np.int64)],[np.empty(0,dtype=np.int64)]
+    for k in range(1,len(stripes)):
+        y = bounds[k]
+        if y == bounds[k-1] or y >= h: continue
+        upper = np.where(runs[y-1] >= 0,runs[y-1]+offsets[k-1],-1)
+        lower = np.where(runs[y] >= 0,runs[y]+offsets[k],-1)
+        linkA,linkB = rowLinks(upper,lower)
+        a.append(root[linkA])
+        b.append(root[linkB])
+    a,b = np.concatenate(a),np.concatenate(b)
+    if len(a):
+        merged = joinRuns(total,a,b)
+        root = merged[root]
+    sizes = np.bincount(root,weights=lengths,minlength=total).astype(np.int64)
+    #A component's root is its first run in scan order, so numbering roots in order keeps caves in scan order.
+    caveRoots = np.flatnonzero((root == np.arange(total)) & (sizes >= minCave))
+    caveIds = np.full(total+1,-1,dtype=np.int32)
+    caveIds[caveRoots] = np.arange(len(caveRoots),dtype=np.int32)
+    runCave = caveIds[root] if total else caveIds[:0]
+    runCave = np.append(runCave,-1).astype(np.int32)
+    labels = array('i',[-1])*(h*w)
+    flat = np.frombuffer(labels,dtype=np.int32).reshape(h,w)
+    stripeOf = {top:k for k,top in enumerate(bounds[:-1])}
+    def resolve(top,bottom):
+        k = stripeOf[top]
+        run = runs[top:bottom]
+        local = np.where(run >= 0,run+offsets[k],total)
+        np.take(runCave,local,out=flat[top:bottom])
+        if fill: cells[top:bottom][(run >= 0) & (flat[top:bottom] < 0)] = 1
+    runStripes(resolve)
+    return labels,array('i',sizes[caveRoots].astype(np.int32).tobytes())
+
+class CaveReferences(Mapping):
+    '''Read-only Tile -> cave index view over a label grid.'''
+    def __init__(self,labels,h,w):
+        self.labels = labels
+        self.h = h
+        self.w = w
+
+    def __getitem__(self,tile):
+        y,x = tile
+        if 0<=y<self.h and 0<=x<self.w:
+            label = self.labels[y*self.w+x]
+            if label >= 0: return label
+        raise KeyError(tile)
+
+    def __iter__(self):
+        for i,label in enumerate(self.labels):
+            if label >= 0: yield Tile(*divmod(i,self.w))
+
+    def __len__(self):
+        return sum(1 for label in self.labels if label >= 0)
+
+class CaveTiles(Sequence):
+    '''Read-only view of the tiles of each cave in a label grid. With a CaveIndex, a single cave is looked up within its bounding box.'''
+    def __init__(self,labels,sizes,h,w,index=None):
+        self.labels = labels
+        self.sizes = sizes
+        self.h = h
+        self.w = w
+        self.index = index
+
+    def __getitem__(self,k):
+        if not -len(self.sizes) <= k < len(self.sizes):
+            raise IndexError(k)
+        k %= len(self.sizes)
+        if self.index is None:
+            return [Tile(*divmod(i,self.w)) for i,label in enumerate(self.labels) if label == k]
+        minY,minX,maxY,maxX = self.index.box(k)
+        return [Tile(y,x) for y in range(minY,maxY+1) for x in range(minX,maxX+1) if self.labels[y*self.w+x] == k]
+
+    def __iter__(self):
+        caves = [[] for _ in self.sizes]
+        for i,label in enumerate(self.labels):
+            if label >= 0: caves[label].append(Tile(*divmod(i,self.w)))
+        return iter(caves)
+
+    def __len__(self):
+        return len(self.sizes)
+
+class WallIndex:
+    '''Grid bucket spatial index over a set of tiles, for nearest tile queries.'''
+    def __init__(self,tiles,size=16):
+        self.size = size
+        self.buckets = {}
+        for tile in tiles:
+            self.buckets.setdefault((tile.y//size,tile.x//size),[]).append(tile)
+        self.box = (min(t.y for t in tiles),min(t.x for t in tiles),max(t.y for t in tiles),max(t.x for t in tiles))
+
+    def nearest(self,tile,best=float('inf')):
+        '''Returns (squared distance, tile) for the closest indexed tile nearer than best, or None.'''
+        minY,minX,maxY,maxX = self.box
+        dy,dx = max(0,minY-tile.y,tile.y-maxY),max(0,minX-tile.x,tile.x-maxX)
+        if dy*dy+dx*dx >= best: return None
+        size = self.size
+        by,bx = tile.y//size,tile.x//size
+        top,left,bottom,right = minY//size-by,minX//size-bx,maxY//size-by,maxX//size-bx
+        found = None
+        for r in range(max(0,top,left,-bottom,-right),max(-top,-left,bottom,right)+1):
+            #Every tile in ring r is at least (r-1)*size+1 cells away along one axis.
+            if r > 0 and ((r-1)*size+1)**2 >= best: break
+            for j in range(max(-r,top),min(r,bottom)+1):
+                if abs(j) == r: columns = range(max(-r,left),min(r,right)+1)
+                else: columns = [i for i in ((-r,r) if r else (0,)) if left <= i <= right]
+                for i in columns:
+                    for other in self.buckets.get((by+j,bx+i),()):
+                        dist = SQ_DIST(tile,other)
+                        if dist < best:
+                            best,found = dist,other
+        return None if found is None else (best,found)
+
+    @staticmethod
+    def nearestPair(walls,indexes,a,b,bound=float('inf')):
+        '''(squared distance, (tileA,tileB)) of the nearest tiles of walls[a] and walls[b], or None when none are nearer than
+        bound. indexes caches a WallIndex per cave.'''
+        first,second = (a,b) if len(walls[a]) <= len(walls[b]) else (b,a)
+        if second not in indexes: indexes[second] = WallIndex(walls[second])
+        best,pair = bound,None
+        for tile in walls[first]:
+            found = indexes[second].nearest(tile,best)
+            if found: best,pair = found[0],(tile,found[1])
+        if pair is None: return None
+        return best,pair if first == a else pair[::-1]
+
+class CaveBuckets:
+    '''Grid bucket spatial index over the bounding boxes of the caves in a CaveIndex, with about one cave per bucket.
+    nearest(a) finds the caves closest to cave a by box distance without comparing it to every other cave.'''
+    def __init__(self,index,distance):
+        n = len(index)
+        self.index = index
+        self.distance = distance
+        self.size = size = max(1,int((index.h*index.w/max(1,n))**0.5))
+        self.rows,self.cols = (index.h-1)//size+1,(index.w-1)//size+1
+        self.buckets = {}
+        for k in range(n):
+            minY,minX,maxY,maxX = index.box(k)
+            for by in range(minY//size,maxY//size+1):
+                for bx in range(minX//size,maxX//size+1):
+                    self.buckets.setdefault((by,bx),[]).append(k)
+
+    def ring(self,top,left,bottom,right,r):
+        '''Buckets at Chebyshev distance r from the bucket rectangle top..bottom, left..right, clipped to the grid.'''
+        y0,y1,x0,x1 = max(0,top-r),min(self.rows-1,bottom+r),max(0,left-r),min(self.cols-1,right+r)
+        for by in range(y0,y1+1):
+            if r == 0 or by in (top-r,bottom+r): columns = range(x0,x1+1)
+            else: columns = [bx for bx in (left-r,right+r) if x0 <= bx <= x1]
+            for bx in columns:
+                yield from self.buckets.get((by,bx),())
+
+    def nearest(self,a):
+        '''Yields (box distance, cave) for every cave other than a, nearest first and ties by cave number.'''
+        size = self.size
+        minY,minX,maxY,maxX = self.index.box(a)
+        top,left,bottom,right = minY//size,minX//size,maxY//size,maxX//size
+        last = max(top,left,self.rows-1-bottom,self.cols-1-right)
+        seen = {a}
+        pending = []
+        for r in range(last+1):
+            for b in self.ring(top,left,bottom,right,r):
+                if b not in seen:
+                    seen.add(b)
+                    heapq.heappush(pending,(self.distance(a,b),b))
+            #A cave outside rings 0..r is more than r buckets away along one axis, so at least r*size+1 cells.
+            bound = (r*size+1)**2
+            while pending and pending[0][0] < bound:
+                yield heapq.heappop(pending)
+        while pending:
+            yield heapq.heappop(pending)
+
+class CaveIndex:
+    '''Metadata of every cave in a label grid, computed once and kept in flat arrays indexed by cave number:
+    area, bounding box, centroid, spawn tile (the cave tile nearest the centroid) and boundary tiles.
+    Boundary tiles of all caves share one array of flat indices, cave k's being boundary[boundaryStart[k]:boundaryStart[k+1]].
+    isBoundary(y,x) decides which cave tiles are boundary tiles.'''
+    def __init__(self,labels,sizes,h,w,isBoundary):
+        n = len(sizes)
+        self.labels = labels
+        self.h = h
+        self.w = w
+        self.area = sizes
+        self.minY,self.minX = array('i',[h])*n,array('i',[w])*n
+        self.maxY,self.maxX = array('i',[-1])*n,array('i',[-1])*n
+        sumY,sumX = array('d',[0])*n,array('d',[0])*n
+        boundaries = [array('i') for _ in range(n)]
+        for i,label in enumerate(labels):
+            if label < 0: continue
+            y,x = divmod(i,w)
+            if y < self.minY[label]: self.minY[label] = y
+            if y > self.maxY[label]: self.maxY[label] = y
+            if x < self.minX[label]: self.minX[label] = x
+            if x > self.maxX[label]: self.maxX[label] = x
+            sumY[label] += y
+            sumX[label] += x
+            if isBoundary(y,x): boundaries[label].append(i)
+        self.centroidY = array('d',(total/area for total,area in zip(sumY,sizes)))
+        self.centroidX = array('d',(total/area for total,area in zip(sumX,sizes)))
+        self.boundary = array('i')
+        self.boundaryStart = array('i',[0])
+        for tiles in boundaries:
+            self.boundary.extend(tiles)
+            self.boundaryStart.append(len(self.boundary))
+        #Centroids of concave caves can fall outside them, so the spawn tile is the nearest tile that is in the cave.
+        self.spawn = array('i',[-1])*n
+        best = array('d',[float('inf')])*n
+        for i,label in enumerate(labels):
+            if label < 0: continue
+            y,x = divmod(i,w)
+            dist = (y-self.centroidY[label])**2 + (x-self.centroidX[label])**2
+            if dist < best[label]: best[label],self.spawn[label] = dist,i
+        self.edges = None
+        self.nearest = None      #Closest cave of every cave by its nearest walls, -1 for none, filled in by adjacency().
+        self.nearestDist = None  #Squared distance between those walls.
+
+    @classmethod
+    def fromArrays(cls,labels,sizes,h,w,boundary):
+        '''Builds the same index with numpy, boundary being a flat bool array marking the boundary tiles.'''
+        index = cls.__new__(cls)
+        n = len(sizes)
+        index.labels,index.h,index.w,index.area = labels,h,w,sizes
+        index.edges = index.nearest = index.nearestDist = None
+        flat = np.frombuffer(labels,dtype=np.int32)
+        cells = np.flatnonzero(flat >= 0)
+        caves = flat[cells]
+        ys,xs = np.divmod(cells,w)
+        #Group tiles by cave, keeping scan order within each cave.
+        order = np.argsort(caves,kind='stable')
+        starts = np.zeros(n+1,dtype=np.int64)
+        np.cumsum(np.frombuffer(sizes,dtype=np.int32),out=starts[1:])
+        first = starts[:-1]
+        def compact(typecode,values):
+            result = array(typecode)
+            result.frombytes(np.ascontiguousarray(values,dtype=np.int32 if typecode == 'i' else np.float64).tobytes())
+            return result
+        groupedX = xs[order]
+        index.minY,index.maxY = compact('i',ys[order][first]),compact('i',ys[order][starts[1:]-1])
+        index.minX = compact('i',np.minimum.reduceat(groupedX,first) if n else groupedX[:0])
+        index.maxX = compact('i',np.maximum.reduceat(groupedX,first) if n else groupedX[:0])
+        areas = np.frombuffer(sizes,dtype=np.int32)
+        centroidY = np.bincount(caves,weights=ys,minlength=n)/areas
+        centroidX = np.bincount(caves,weights=xs,minlength=n)/areas
+        index.centroidY,index.centroidX = compact('d',centroidY),compact('d',centroidX)
+        edge = cells[boundary[cells]]
+        edgeCaves = flat[edge]
+        index.boundary = compact('i',edge[np.argsort(edgeCaves,kind='stable')])
+        index.boundaryStart = array('i',[0])
+        index.boundaryStart.extend(np.cumsum(np.bincount(edgeCaves,minlength=n)).tolist())
+        #The spawn tile is the first tile in scan order at the smallest distance from the centroid, as in __init__.
+        dist = (ys-centroidY[caves])**2 + (xs-centroidX[caves])**2
+        closest = np.minimum.reduceat(dist[order],first) if n else dist[:0]
+        candidates = np.flatnonzero(dist == closest[caves])
+        _,firstCandidate = np.unique(caves[candidates],return_index=True)
+        index.spawn = compact('i',cells[candidates[firstCandidate]])
+        return index
+
+    def __len__(self):
+        return len(self.area)
+
+    def caveAt(self,tile):
+        '''Cave number of a tile, -1 for walls and tiles outside the level.'''
+        y,x = tile
+        return self.labels[y*self.w+x] if 0<=y<self.h and 0<=x<self.w else -1
+
+    def box(self,k):
+        '''(minY,minX,maxY,maxX) of cave k, inclusive.'''
+        return self.minY[k],self.minX[k],self.maxY[k],self.maxX[k]
+
+    def centroid(self,k):
+        return self.centroidY[k],self.centroidX[k]
+
+    def spawnTile(self,k):
+        return Tile(*divmod(self.spawn[k],self.w))
+
+    def boundaryTiles(self,k):
+        return [Tile(*divmod(i,self.w)) for i in self.boundary[self.boundaryStart[k]:self.boundaryStart[k+1]]]
+
+    def tiles(self,k):
+        '''Every tile of cave k in scan order.'''
+        minY,minX,maxY,maxX = self.box(k)
+        w,labels = self.w,self.labels
+        return [Tile(y,x) for y in range(minY,maxY+1) for x in range(minX,maxX+1) if labels[y*w+x] == k]
+
+    def walls(self,k):
+        '''Boundary tiles of cave k, or all its tiles for a cave without any.'''
+        return self.boundaryTiles(k) or self.tiles(k)
+
+    def boxDistance(self,a,b):
+        '''Squared distance between the bounding boxes of caves a and b, a lower bound on their nearest tiles.'''
+        minYa,minXa,maxYa,maxXa = self.box(a)
+        minYb,minXb,maxYb,maxXb = self.box(b)
+        dy = max(0,minYb-maxYa,minYa-maxYb)
+        dx = max(0,minXb-maxXa,minXa-maxXb)
+        return dy*dy+dx*dx
+
+    def largest(self):
+        '''Number of the cave with the most tiles, or -1 without caves.'''
+        return max(range(len(self.area)),key=self.area.__getitem__,default=-1)
+
+    def adjacency(self):
+        '''Cave adjacency graph as {(a,b): (squared distance, tileA, tileB)} with a < b, computed on first use.
+        Caves grow outwards through the walls together (8-connected breadth first) and two caves are adjacent where their
+        regions meet. Regions cover the whole level, so the graph is connected. The recorded pair is the nearest pair of
+        walls (see walls) of the two caves, as connectSpanning measures it, searched first among pairs nearer than the
+        closest source tiles seen along their border. Also fills in nearest and nearestDist, which may name a cave that
+        is not adjacent.'''
+        if self.edges is not None: return self.edges
+        h,w,labels = self.h,self.w,self.labels
+        owner = array('i',labels)
+        source = array('i',range(h*w))
+        frontier = [i for i,label in enumerate(labels) if label >= 0]
+        edges = {}
+        while frontier:
+            grown = []
+            for i in frontier:
+                a = owner[i]
+                y,x = divmod(i,w)
+                for Ny in range(max(0,y-1),min(h,y+2)):
+                    base = Ny*w
+                    for n in range(base+max(0,x-1),base+min(w,x+2)):
+                        b = owner[n]
+                        if b < 0:
+                            owner[n],source[n] = a,source[i]
+                            grown.append(n)
+                        elif b != a:
+                            (sy,sx),(ty,tx) = divmod(source[i],w),divmod(source[n],w)
+                            dist = (sy-ty)**2 + (sx-tx)**2
+                            key = (a,b) if a < b else (b,a)
+                            if key not in edges or dist < edges[key][0]:
+                                pair = (Tile(sy,sx),Tile(ty,tx)) if a < b else (Tile(ty,tx),Tile(sy,sx))
+                                edges[key] = (dist,)+pair
+            frontier = grown
+        n = len(self.area)
+        walls = [self.walls(k) for k in range(n)]
+        indexes = {}
+        best = [(float('inf'),-1)]*n
+        for key,(dist,_,_) in edges.items():
+            #Source tiles need not be walls, so their distance is only a likely bound.
+            dist,pair = WallIndex.nearestPair(walls,indexes,*key,dist+1) or WallIndex.nearestPair(walls,indexes,*key)
+            edges[key] = (dist,)+pair
+            a,b = key
+            best[a],best[b] = min(best[a],(dist,b)),min(best[b],(dist,a))
+        #Region borders follow 8-connected steps rather than straight lines, so a cave that is not adjacent can still be
+        #nearer. Only caves whose bounding boxes are within the best distance so far need measuring.
+        buckets = CaveBuckets(self,self.boxDistance)
+        for k in range(n):
+            for bound,other in buckets.nearest(k):
+                if bound > best[k][0]: break
+                key = (k,other) if k < other else (other,k)
+                if key in edges: continue
+                found = WallIndex.nearestPair(walls,indexes,k,other,best[k][0]+1)
+                if found: best[k] = min(best[k],(found[0],other))
+        self.nearest = array('i',(other for _,other in best))
+        self.nearestDist = array('q',(-1 if other < 0 else dist for dist,other in best))
+        self.edges = edges
+        return edges
+
+    def nearestCave(self,k):
+        '''(cave, squared distance) of the cave whose walls are nearest to cave k's, ties going to the lower cave number,
+        or None when k is the only cave. The distance is exact, between the nearest pair of walls of the two caves.'''
+        self.adjacency()
+        return None if self.nearest[k] < 0 else (self.nearest[k],self.nearestDist[k])
+
 class AutomaticCell:
-    def __init__(self,h,w):
+    PARAMS = ('sims','initLive','death','birth','minCave','minNei','useNumpy','connectMode','incremental','distances','probes','threads')
+
+    def __init__(self,h,w,seed=None):
         self.h = h
         self.w = w
+        self.rng = random if seed is None else random.Random(seed) #Maps with a seed get their own generator, otherwise the global random module is used.
         self.center = Tile(self.h//2,self.w//2)
-        self.level = [[False for _ in range(self.w)] for _ in range(self.h)]
+        self.level = Grid(self.h,self.w)
         self.caves = []
         self.cavesReferences = {}
         self.cavesWalls = []
+        self.scratch = None          #Reusable numpy buffers for stepSimulateArray.
+        self.pool = None             #Thread pool running row stripes, created when threads > 1 and shut down by close().
+        self.poolSize = 0            #Number of threads in pool.
+        self.active = None           #Incremental mode: flat indices of cells to re-evaluate next step, None for every cell.
+        self.settled = None          #Incremental mode: copy of the level after the last step, to spot cells changed in between.
+        self.stable = False          #Incremental mode: True once a step changed nothing.
+        self.labels = array('i')     #Cave index of every tile (y*w+x) from the last cleanup, -1 for walls.
+        self.caveSizes = array('i')  #Number of tiles in each cave.
+        self.index = None            #CaveIndex of the caves found by the last cleanup.
+        self.stats = None            #GenerationStats of the GENERATE run in progress, if one was passed in.
+        self.clearance = None        #With distances: steps from every cell to the nearest wall, flat like labels.
+        self.spawnDistances = None   #With distances: steps from the spawn tile to every cell, -1 where it cannot be reached.
+        self.corridors = []          #(caveA,caveB,tileA,tileB) for every corridor carved by connectSpanning or connectPlanned, caves numbered as in the cleanup before it.
+        self.connections = None      #ConnectionReport of the last connectPlanned.
 
         self.sims = 8           #Number of times to run the celular automata model
         self.initLive = 0.40    #Initial amout of live cells.
@@ -32,20 +543,102 @@ class AutomaticCell:
         self.birth = 4          #Cells with more than, or equal to this amount of neigbors will spontaneously resurect.
         self.minCave = 50       #Minimum size of a valid cave in cells
         self.minNei = 4         #Minimum number of neighbors for a valid wall.
+        self.useNumpy = False   #Store the level as a numpy array and simulate with whole-array masks. Requires numpy.
+        self.connectMode = 'lines'  #How caves are joined: 'lines' (random bresenham lines), 'spanning' (minimum spanning tree of nearest walls) or 'planned' (see connectPlanned).
+        self.incremental = False    #Only re-evaluate cells whose neighborhood changed, and stop simulating once nothing changes.
+        self.distances = False      #After finalizing, compute clearance and spawnDistances (see DungeonPaths).
+        self.probes = 3             #connectMode 'planned': most cave pairs measured per cave.
+        self.threads = 1            #With useNumpy, split simulate, prune, cave labeling and finalize passes into this many row stripes run on a thread pool.
 
-    def GENERATE(self):
-        '''Performs level generation.'''
-        self.setUpInitial()
-        for _ in range(self.sims-2):
-            self.level = self.stepSimulate()
-        self.cleanup()
-        self.connect()
-        for _ in range(2):
-            self.level = self.stepSimulate()
-        self.cleanup()
-        self.finalize()
+    def configure(self,**params):
+        '''Sets tunables by name, e.g. configure(sims=6,minCave=30).'''
+        for name,value in params.items():
+            if name not in self.PARAMS:
+                raise ValueError(f"Unknown AutomaticCell parameter '{name}'.")
+            setattr(self,name,value)
+        return self
+
+    def GENERATE(self,stats=None):
+        '''Performs level generation. Pass a GenerationStats to record wall time and counters for every phase.'''
+        for _ in self.stages(stats): pass
         return self.level
 
+    def completeLevel(self,stats=None):
+        '''Runs the rest of GENERATE on a level that has been through its first sims-2 simulation steps.'''
+        for _ in self.completeStages(stats): pass
+        return self.level
+
+    def frames(self,stats=None,diffs=False):
+        '''Runs GENERATE, yielding a Frame after setUpInitial, every simulation step, cleanup, connect and finalize.
+        Frame.level is a read-only (h,w) view of the level buffer, not a copy, so it is only valid until the next frame is
+        asked for. With diffs, Frame.changed is the set of flat indices (y*w+x) changed since the previous frame.
+        With stats, phase times include the time spent between frames.'''
+        previous = bytearray(self.level.buffer) if diffs else None
+        for stage in self.stages(stats):
+            yield Frame(stage,self.level.view(),self.changedCells(previous) if diffs else None)
+
+    def changedCells(self,previous):
+        '''Flat indices of the cells that differ between the level and previous, a bytearray copy of an earlier level that is brought up to date.'''
+        cells,w = self.level.buffer,self.w
+        if self.useNumpy:
+            before = np.frombuffer(previous,dtype=np.uint8)
+            changed = set(np.flatnonzero(np.frombuffer(cells,dtype=np.uint8) != before).tolist())
+            before[:] = np.frombuffer(cells,dtype=np.uint8)
+            return changed
+        changed = set()
+        for start in range(0,len(cells),w):
+            if cells[start:start+w] == previous[start:start+w]: continue
+            changed.update(i for i in range(start,start+w) if cells[i] != previous[i])
+            previous[start:start+w] = cells[start:start+w]
+        return changed
+
+    def stages(self,stats=None):
+        '''GENERATE as a generator, yielding the name of each phase as it finishes and 'stepSimulate' after every simulation step.'''
+        self.stats = stats
+        phase = stats.phase if stats else nullcontext
+        try:
+            with phase('setUpInitial'):
+                self.setUpInitial()
+            yield 'setUpInitial'
+            with phase('stepSimulate'):
+                yield from self.simulateSteps(self.sims-2)
+            yield from self.completeStages(stats)
+        finally:
+            self.close()
+
+    def completeStages(self,stats=None):
+        '''The stages of GENERATE from the first cleanup on.'''
+        self.stats = stats
+        phase = stats.phase if stats else nullcontext
+        try:
+            with phase('cleanup'):
+                self.cleanup()
+            yield 'cleanup'
+            with phase('connect'):
+                if self.connectMode == 'lines': self.connect()
+                elif self.connectMode == 'spanning': self.connectSpanning()
+                elif self.connectMode == 'planned': self.connectPlanned()
+                else: raise ValueError(f"Unknown connectMode '{self.connectMode}'.")
+            yield 'connect'
+            with phase('stepSimulate'):
+                yield from self.simulateSteps(2)
+            with phase('cleanup'):
+                self.cleanup()
+            yield 'cleanup'
+            #Smoothing can pinch corridors or caves closed again, so the spanning tree is completed over what is left.
+            if self.connectMode in ('spanning','planned'):
+                with phase('connect'):
+                    self.connectSpanning() if self.connectMode == 'spanning' else self.connectPlanned()
+                yield 'connect'
+            with phase('finalize'):
+                self.finalize()
+            yield 'finalize'
+            if self.distances:
+                with phase('distances'):
+                    self.calcDistances()
+        finally:
+            self.close()
+
     def neighbors(self,y,x):
         '''Counts up neighboring live cells, treating Out Of Bounds as alive.'''
         count = 0
@@ -73,65 +666,289 @@ class AutomaticCell:
                 returner.append(True)
         return returner
 
-    def floodFill(self,y,x):
-        '''Floods cave areas from a point (y,x), ignoring walls.'''
-        cave = set()
-        toBeFilled = set([Tile(y,x)])
-        while toBeFilled:
-            tile = toBeFilled.pop()
-            if tile not in cave:
-                cave.add(tile)
-                self.level[tile.y][tile.x] = True
-                neighboringTiles = FLATTEN([[ADD(tile,Tile(i,j)) for i in range(-1,2) if not (i==0 and j==0)] for j in range(-1,2)])
-                for adj in [Tile(j,i) for j,i in neighboringTiles if 0<=j<self.h and 0<=i<self.w and not self.level[j][i]]:
-                    if self.level[adj.y][adj.x] == 0:
-                        if adj not in toBeFilled and adj not in cave:
-                            toBeFilled.add(adj)
-        if len(cave) >= self.minCave:
-            self.caves.append(list(cave))
-            self.cavesReferences.update({k:len(self.caves)-1 for k in cave})
-
     def calcWalls(self,cave):
             caveNeighbors = dict()
             for tile in cave:
                 caveNeighbors[tile] = self.neighbors(tile.y,tile.x)
             return [k for k,v in caveNeighbors.items() if v >= self.minNei]
 
+    def isWall(self,y,x):
+        '''Whether cave tile y,x borders enough live cells to count as one of its cave's walls.'''
+        return self.neighbors(y,x) >= self.minNei
+
     def setUpInitial(self):
         '''Sets up initial map, before cell simulation is applied. Percent of living cells is controlled by 'self.initLive' parameter.'''
+        self.active = self.settled = None
         for y,row in enumerate(self.level):
             for x,_ in enumerate(row):
-                if random.random() < self.initLive:
+                if self.rng.random() < self.initLive:
                     self.level[y][x] = True
 
+    def simulate(self,steps):
+        '''Runs up to steps simulation steps, stopping early in incremental mode once the level is stable.'''
+        for _ in self.simulateSteps(steps): pass
+
+    def simulateSteps(self,steps):
+        '''simulate as a generator, yielding 'stepSimulate' after every step.'''
+        for _ in range(steps):
+            self.level = self.stepSimulate()
+            yield 'stepSimulate'
+            if self.incremental and self.stable: break
+
     def stepSimulate(self):
         '''Simulates one step in the cell simulation process.'''
-        levelChanged = [[False for _ in range(self.w)] for _ in range(self.h)]
+        if not isinstance(self.level,Grid): self.level = Grid.fromRows(self.level)
+        if self.useNumpy: return self.stepSimulateArray()
+        if self.incremental: return self.stepSimulateIncremental()
+        levelChanged = self.level.backRows
         for y,row in enumerate(self.level):
+            changedRow = levelChanged[y]
             for x,wall in enumerate(row):
                 surrounding = self.neighbors(y,x)
                 if wall:
-                    if surrounding < self.death: levelChanged[y][x] = False
-                    else: levelChanged[y][x] = True
+                    if surrounding < self.death: changedRow[x] = False
+                    else: changedRow[x] = True
                 else:
-                    if surrounding >= self.birth: levelChanged[y][x] = True
-                    else: levelChanged[y][x] = False
-        return levelChanged
+                    if surrounding >= self.birth: changedRow[x] = True
+                    else: changedRow[x] = False
+        self.level.swap()
+        if self.stats: self.countStep()
+        return self.level
+
+    def stepSimulateArray(self):
+        '''Simulates one step in the cell simulation process with whole-array numpy masks, matching stepSimulate cell for cell.'''
+        counts = self.neighborCountsArray()
+        survive = self.scratch[2]
+        level = self.level.asArray()
+        levelChanged = self.level.asArray(back=True).view(bool)
+        def step(top,bottom):
+            np.greater_equal(counts[top:bottom],self.birth,out=levelChanged[top:bottom])
+            np.greater_equal(counts[top:bottom],self.death,out=survive[top:bottom])
+            np.copyto(levelChanged[top:bottom],survive[top:bottom],where=level[top:bottom].view(bool))
+        self.runStripes(step)
+        self.level.swap()
+        if self.incremental: self.stable = np.array_equal(self.level.asArray(),self.level.asArray(back=True))
+        if self.stats: self.countStep()
+        return self.level
+
+    def neighborCountsArray(self):
+        '''neighbors() of every cell of the level at once, as an (h,w) uint8 array reused between calls.'''
+        if np is None:
+            raise RuntimeError("useNumpy requires numpy to be installed.")
+        if self.scratch is None or self.scratch[0].shape != (self.h+2,self.w+2):
+            self.scratch = (np.ones((self.h+2,self.w+2),dtype=np.uint8),np.empty((self.h,self.w),dtype=np.uint8),np.empty((self.h,self.w),dtype=bool))
+        padded,counts,_ = self.scratch
+        level = self.level.asArray()
+        def pad(top,bottom):
+            padded[top+1:bottom+1,1:-1] = level[top:bottom]
+            #neighbors() counts column 0 as out of bounds and lets column -1 wrap around to the last column, so mirror that here.
+            padded[top+1:bottom+1,1] = 1
+            padded[top+1:bottom+1,0] = level[top:bottom,-1]
+        def count(top,bottom):
+            #Each stripe reads one halo row of padded above and below it and writes only its own rows.
+            total = counts[top:bottom]
+            np.copyto(total,padded[top:bottom,:-2])
+            for j in range(3):
+                for i in range(3):
+                    if j or i: np.add(total,padded[top+j:bottom+j,i:i+self.w],out=total)
+            np.subtract(total,padded[top+1:bottom+1,1:-1],out=total)
+        self.runStripes(pad)
+        self.runStripes(count)
+        return counts
+
+    def runStripes(self,kernel):
+        '''Calls kernel(top,bottom) for horizontal stripes of rows covering the level, on self.threads threads, and returns the results.
+        Kernels must only write their own rows; numpy releases the GIL inside them, so stripes run in parallel.'''
+        stripes = max(1,min(self.threads,self.h))
+        bounds = [self.h*k//stripes for k in range(stripes+1)]
+        if stripes == 1:
+            return [kernel(0,self.h)]
+        if self.pool is None or self.poolSize != stripes:
+            from concurrent.futures import ThreadPoolExecutor
+            self.close()
+            self.pool,self.poolSize = ThreadPoolExecutor(stripes),stripes
+        return list(self.pool.map(kernel,bounds[:-1],bounds[1:]))
+
+    def close(self):
+        '''Shuts down the row stripe thread pool, if one was started. GENERATE calls this when it is done.'''
+        if self.pool: self.pool.shutdown()
+        self.pool,self.poolSize = None,0
+
+    def orthogonalSettle(self,initial,rule,cell,border=False):
+        '''Solves a cell by cell pass in scan order as whole-array masks, for passes where a cell reads its up and left
+        neighbors as already updated and its down and right neighbors as they were before the pass.
+        rule(up,left,top,bottom,out) writes the new bool states of rows top to bottom into out, from the up and left
+        neighbor states. Starting from initial, the rule is re-applied until nothing changes; as every cell only depends
+        on cells before it in scan order, that settles on exactly what the sequential pass gives. Rows above the first
+        one that changed are final and are not visited again. border is the state of the out of bounds up and left neighbors.
+        A chain of dependent cells (such as a long horizontal wall) would need one pass per cell, so after SETTLE_PASSES
+        passes the cells still off are fixed one at a time: cell(i,up,left) gives the new state of flat cell i (y*w+x),
+        and only the cells right of and below a cell that changed are looked at again, in scan order.'''
+        h,w = self.h,self.w
+        current = np.empty((h+1,w+1),dtype=bool)
+        current[0,:] = current[:,0] = border
+        current[1:,1:] = initial
+        updated = current.copy()
+        differs = np.empty((h,w),dtype=bool)
+        first = 0
+        def settle(top,bottom):
+            top = max(top,first)
+            if top >= bottom: return h
+            rows = updated[top+1:bottom+1,1:]
+            rule(current[top:bottom,1:],current[top+1:bottom+1,:-1],top,bottom,rows)
+            changed = np.not_equal(rows,current[top+1:bottom+1,1:],out=differs[top:bottom]).any(axis=1)
+            return top + int(changed.argmax()) if changed.any() else h
+        for _ in range(SETTLE_PASSES):
+            if first >= h: return current[1:,1:]
+            top,first = first,min(self.runStripes(settle))
+            current,updated = updated,current
+        if first >= h: return current[1:,1:]
+        #Only cells reading a cell the last pass changed can still be off. Taking them in scan order means their up and
+        #left neighbors are final by the time they are looked at, so each cell is fixed at most once.
+        ys,xs = np.nonzero(differs[top:])
+        ys += top
+        queue = np.concatenate(((ys*w+xs+1)[xs+1 < w],(ys*w+xs+w)[ys+1 < h])).tolist()
+        queued = set(queue)
+        queue = sorted(queued)
+        states = memoryview(current.view(np.uint8).reshape(-1))
+        W = w+1
+        while queue:
+            i = heapq.heappop(queue)
+            queued.discard(i)
+            y,x = divmod(i,w)
+            p = (y+1)*W+x+1
+            state = 1 if cell(i,states[p-W],states[p-1]) else 0
+            if state == states[p]: continue
+            states[p] = state
+            for j in ((i+1) if x+1 < w else -1,(i+w) if y+1 < h else -1):
+                if j >= 0 and j not in queued:
+                    queued.add(j)
+                    heapq.heappush(queue,j)
+        return current[1:,1:]
+
+    def pruneArray(self):
+        '''cleanup's prune pass with numpy, matching it cell for cell. Returns how many walls were pruned.'''
+        level = self.level.asArray()
+        walls = level.view(bool)
+        padded = np.zeros((self.h+2,self.w+2),dtype=np.int8)
+        padded[1:-1,1:-1] = level
+        counts = np.empty((self.h,self.w),dtype=np.int8)
+        remaining = np.empty((self.h,self.w),dtype=np.int8)
+        def count(top,bottom):
+            np.add(padded[top:bottom,1:-1],padded[top+2:bottom+2,1:-1],out=counts[top:bottom])
+            counts[top:bottom] += padded[top+1:bottom+1,:-2]
+            counts[top:bottom] += padded[top+1:bottom+1,2:]
+        self.runStripes(count)
+        #A pruned wall above or to the left no longer counts; walls below and to the right are not pruned yet when the pass reaches a cell.
+        def rule(up,left,top,bottom,out):
+            rest = remaining[top:bottom]
+            np.subtract(counts[top:bottom],up,out=rest)
+            np.subtract(rest,left,out=rest)
+            np.less_equal(rest,1,out=out)
+            np.logical_and(out,walls[top:bottom],out=out)
+        flatWalls,flatCounts = memoryview(level.reshape(-1)),memoryview(counts.reshape(-1))
+        cell = lambda i,up,left: flatWalls[i] and flatCounts[i]-up-left <= 1
+        pruned = self.orthogonalSettle(np.zeros((self.h,self.w),dtype=bool),rule,cell)
+        self.runStripes(lambda top,bottom: np.copyto(level[top:bottom],0,where=pruned[top:bottom]))
+        return int(np.count_nonzero(pruned))
+
+    def finalizeArray(self):
+        '''finalize with numpy, matching it cell for cell. Returns how many walls were opened.'''
+        level = self.level.asArray()
+        #orthSpecific counts out of bounds neighbors as walls.
+        padded = np.ones((self.h+2,self.w+2),dtype=bool)
+        padded[1:-1,1:-1] = level
+        walls,down,right = padded[1:-1,1:-1],padded[2:,1:-1],padded[1:-1,2:]
+        vertical = np.empty((self.h,self.w),dtype=bool)
+        def rule(up,left,top,bottom,out):
+            np.logical_or(up,down[top:bottom],out=vertical[top:bottom])
+            np.logical_or(left,right[top:bottom],out=out)
+            np.logical_and(out,vertical[top:bottom],out=out)
+            np.logical_and(out,walls[top:bottom],out=out)
+        flat,w,size = memoryview(level.reshape(-1)),self.w,self.h*self.w
+        def cell(i,up,left):
+            return flat[i] and (up or i+w >= size or flat[i+w]) and (left or i%w == w-1 or flat[i+1])
+        final = self.orthogonalSettle(walls,rule,cell,border=True)
+        opened = int(np.count_nonzero(walls)) - int(np.count_nonzero(final))
+        self.runStripes(lambda top,bottom: np.copyto(level[top:bottom],final[top:bottom]))
+        return opened
+
+    def stepSimulateIncremental(self):
+        '''Simulates one step, re-evaluating only cells whose neighborhood changed since they were last evaluated.
+        Cells edited between steps (by cleanup or connect) are found against the level as the last step left it. Matches stepSimulate cell for cell.'''
+        cells,w = self.level.buffer,self.w
+        if self.active is None or self.settled is None or len(self.settled) != len(cells):
+            active = range(self.h*w)
+            self.settled = bytearray(cells)
+        else:
+            active = self.active
+            for y in range(self.h):
+                start = y*w
+                if cells[start:start+w] == self.settled[start:start+w]: continue
+                for i in range(start,start+w):
+                    if cells[i] != self.settled[i]:
+                        self.settled[i] = cells[i]
+                        self.markAround(active,i)
+        changes = []
+        for i in active:
+            wall = cells[i]
+            if (self.neighbors(*divmod(i,w)) >= (self.death if wall else self.birth)) != bool(wall):
+                changes.append(i)
+        self.active = set()
+        for i in changes:
+            cells[i] = self.settled[i] = 0 if cells[i] else 1
+            self.markAround(self.active,i)
+        self.stable = not changes
+        if self.stats:
+            self.stats.count('steps')
+            self.stats.count('cellsUpdated',len(active))
+            self.stats.count('cellsChanged',len(changes))
+        return self.level
+
+    def markAround(self,cells,i):
+        '''Adds the flat indices of every cell whose neighbors() count reads cell i.'''
+        y,x = divmod(i,self.w)
+        for Ny in range(max(0,y-1),min(self.h,y+2)):
+            base = Ny*self.w
+            cells.update(range(base+max(0,x-1),base+min(self.w,x+2)))
+            #neighbors() wraps column -1 around to the last column.
+            if x == self.w-1: cells.add(base)
+
+    def countStep(self):
+        '''Records a finished simulation step: every cell was updated, cellsChanged counts the ones that flipped.'''
+        if np is not None:
+            changed = int(np.count_nonzero(self.level.asArray() != self.level.asArray(back=True)))
+        else:
+            changed = sum(a != b for a,b in zip(self.level.buffer,self.level.backBuffer))
+        self.stats.count('steps')
+        self.stats.count('cellsUpdated',self.h*self.w)
+        self.stats.count('cellsChanged',changed)
     
     def cleanup(self):
-        '''Removes caves below the minmum cell requirement and live cells with only one neighbor.'''
-        for y,row in enumerate(self.level):
-            for x,wall in enumerate(row):
-                if wall and self.orthNeighbors(y,x) <= 1:
-                    self.level[y][x] = False
-        for y,row in enumerate(self.level):
-            for x,wall in enumerate(row):
-                if not wall: self.floodFill(y,x)
-        for cave in self.caves:
-            for tile in cave:
-                self.level[tile.y][tile.x] = False
-        for cave in self.caves:
-            self.cavesWalls.append(self.calcWalls(cave))
+        '''Removes caves below the minmum cell requirement and live cells with only one neighbor.
+        Every call labels the caves from scratch and lists cave tiles and walls in scan order. The flood-fill cleanup this
+        replaced kept the caves of earlier calls, re-opening them on the second call, and listed walls in set order, so the
+        same seed gives a different map than it did before labelCaves.'''
+        if not isinstance(self.level,Grid): self.level = Grid.fromRows(self.level)
+        vectorized = self.useNumpy and np is not None
+        pruned = self.pruneArray() if vectorized else self.prune()
+        opened = self.level.buffer.count(0)
+        if vectorized:
+            self.labels,self.caveSizes = labelCavesArray(self.level,self.h,self.w,self.minCave,True,self.runStripes)
+        else:
+            self.labels,self.caveSizes = labelCaves(self.level,self.h,self.w,self.minCave,fill=True)
+        if self.stats:
+            self.stats.count('wallsPruned',pruned)
+            self.stats.count('cellsFilled',opened - sum(self.caveSizes))
+            self.stats.count('cavesFound',len(self.caveSizes))
+        if vectorized:
+            boundary = self.neighborCountsArray().reshape(-1) >= self.minNei
+            self.index = CaveIndex.fromArrays(self.labels,self.caveSizes,self.h,self.w,boundary)
+        else:
+            self.index = CaveIndex(self.labels,self.caveSizes,self.h,self.w,self.isWall)
+        self.caves = CaveTiles(self.labels,self.caveSizes,self.h,self.w,self.index)
+        self.cavesReferences = CaveReferences(self.labels,self.h,self.w)
+        self.cavesWalls = [self.index.boundaryTiles(k) for k in range(len(self.index))]
         # if self.level[self.center.y][self.center.x]:
         #     neighboringTiles = FLATTEN([[ADD(self.center,Tile(i,j)) for i in range(-1,2) if not (i==0 and j==0)] for j in range(-1,2)])
         #     for tile in neighboringTiles:
@@ -140,20 +957,40 @@ class AutomaticCell:
         #             return
         #     raise RuntimeError("Center not found. Map invalid.")
 
+    def prune(self):
+        '''Opens walls with at most one orthogonal wall neighbor, in scan order, returning how many were opened.'''
+        pruned = 0
+        last = self.h-1
+        for y,row in enumerate(self.level):
+            above = self.level[y-1] if y > 0 else None
+            below = self.level[y+1] if y < last else None
+            for x,wall in enumerate(row):
+                if not wall: continue
+                count = (x > 0 and row[x-1]) + (x < self.w-1 and row[x+1])
+                if above is not None and above[x]: count += 1
+                if below is not None and below[x]: count += 1
+                if count <= 1:
+                    row[x] = False
+                    pruned += 1
+        return pruned
+
     def connect(self):
         '''Connects caves using bresenham lines.'''
-        cavesWalls = self.cavesWalls
+        from bresenham import bresenham
+        cavesWalls = list(self.cavesWalls)
+        tested = carved = 0
         while len(cavesWalls) > 0:
             currentCaveWalls = cavesWalls.pop()
             for wall in currentCaveWalls:
                 if len(cavesWalls) > 1:
-                    randCave = random.randint(0,len(cavesWalls)-1)
-                    randWall = cavesWalls[randCave][random.randint(0,len(cavesWalls[randCave])-1)]
+                    randCave = self.rng.randint(0,len(cavesWalls)-1)
+                    randWall = cavesWalls[randCave][self.rng.randint(0,len(cavesWalls[randCave])-1)]
                 else:
                     randWall = self.center
                 bresen = list(map(TRANSPOSE,list(bresenham(wall.x,wall.y,randWall.x,randWall.y))))
                 active = False
                 for i,point in enumerate(bresen[1:]):
+                    tested += 1
                     if self.cavesReferences.get(point,-1) == self.cavesReferences[wall]:
                         break
                     elif point in self.cavesReferences and self.cavesReferences[point] != self.cavesReferences[wall]:
@@ -164,49 +1001,174 @@ class AutomaticCell:
                     for point in bresen:
                         for neighbor in FLATTEN([[ADD(point,Tile(i,j)) for i in range(-1,2)] for j in range(-1,2)]):
                             if self.level[neighbor.y][neighbor.x]: self.level[neighbor.y][neighbor.x] = False
+                    carved += 1
                     break
+        if self.stats:
+            self.stats.count('bresenhamPoints',tested)
+            self.stats.count('corridorsCarved',carved)
+
+    def connectSpanning(self):
+        '''Connects every cave along a minimum spanning tree of the nearest wall pairs between caves.
+        Cave pairs are queued by bounding box distance, one per cave at a time from its CaveBuckets.nearest stream, and
+        only measured exactly (through a per-cave WallIndex) when they reach the front of the queue.'''
+        walls = self.connectionWalls()
+        parent = list(range(len(walls)))
+        corridors = []
+        def join(a,b,pair):
+            parent[self.findRoot(parent,b)] = self.findRoot(parent,a)
+            corridors.append((a,b)+pair)
+            self.carveCorridor(*pair)
+        measured = self.joinNearest(walls,{},self.caveStreams(),parent,set(),join,len(walls))
+        self.corridors.extend(corridors)
+        if self.stats:
+            self.stats.count('pairsMeasured',measured)
+            self.stats.count('corridorsCarved',len(corridors))
+        return corridors
+
+    def caveStreams(self):
+        '''CaveBuckets.nearest for every cave of the last cleanup.'''
+        buckets = CaveBuckets(self.index,self.boxDistance)
+        return [buckets.nearest(a) for a in range(len(self.index))]
+
+    def joinNearest(self,walls,indexes,streams,parent,measured,join,groups):
+        '''Lazy Kruskal over the cave streams: calls join(a,b,pair) for the nearest wall pairs that join groups apart, in
+        order of distance, until one group is left. Each cave keeps one entry for the next cave in its stream queued by box
+        distance, replaced as it is popped; pairs are measured exactly once they reach the front. measured holds the pairs
+        (a<b) already measured, groups the number of groups in parent. Returns how many pairs were measured.'''
+        find = lambda cave: self.findRoot(parent,cave)
+        queue = []
+        count = 0
+        def advance(a):
+            found = next(streams[a],None)
+            if found:
+                b = found[1]
+                heapq.heappush(queue,(found[0],False,min(a,b),max(a,b),a))
+        if groups > 1:
+            for a in range(len(streams)): advance(a)
+        while queue and groups > 1:
+            entry = heapq.heappop(queue)
+            a,b = entry[2],entry[3]
+            if not entry[1]: advance(entry[4])
+            if find(a) == find(b): continue
+            if not entry[1]:
+                if (a,b) in measured: continue
+                measured.add((a,b))
+                count += 1
+                dist,pair = WallIndex.nearestPair(walls,indexes,a,b)
+                heapq.heappush(queue,(dist,True,a,b,pair))
+                continue
+            join(a,b,entry[4])
+            groups -= 1
+        return count
+
+    def connectionWalls(self):
+        '''Boundary tiles of every cave, or all its tiles for a cave without any.'''
+        return [self.index.walls(k) for k in range(len(self.index))]
+
+    def boxDistance(self,a,b):
+        '''Squared distance between the bounding boxes of caves a and b, a lower bound on their nearest tiles.'''
+        return self.index.boxDistance(a,b)
+
+    @staticmethod
+    def findRoot(parent,cave):
+        while parent[cave] != cave:
+            parent[cave] = parent[parent[cave]]
+            cave = parent[cave]
+        return cave
+
+    def connectPlanned(self):
+        '''Connects caves with a bounded number of exact measurements, returning a ConnectionReport.
+        Each cave measures its nearest walls to at most self.probes other caves, taken in order of bounding box distance,
+        and corridors are carved along a minimum spanning forest of those measurements. Any groups still apart are then
+        joined along a minimum spanning tree between groups, found as connectSpanning does but only over each cave's next
+        nearest caves, so no step compares every pair of caves. groups lists the caves that ended up connected together.'''
+        walls = self.connectionWalls()
+        n = len(walls)
+        streams = self.caveStreams()
+        indexes = {}
+        measured = {}
+        for a in range(n):
+            for _,b in itertools.islice(streams[a],self.probes):
+                key = (a,b) if a < b else (b,a)
+                if key not in measured: measured[key] = WallIndex.nearestPair(walls,indexes,*key)
+        parent = list(range(n))
+        find = lambda cave: self.findRoot(parent,cave)
+        corridors = []
+        def join(a,b,pair):
+            parent[find(b)] = find(a)
+            corridors.append((a,b)+pair)
+            self.carveCorridor(*pair)
+        for (a,b),(_,pair) in sorted(measured.items(),key=lambda item: (item[1][0],item[0])):
+            if find(a) != find(b): join(a,b,pair)
+        probes = len(measured)
+        probes += self.joinNearest(walls,indexes,streams,parent,set(measured),join,n-len(corridors))
+        groups = {}
+        for cave in range(n):
+            groups.setdefault(find(cave),[]).append(cave)
+        self.corridors.extend(corridors)
+        self.connections = ConnectionReport(corridors,list(groups.values()),probes)
+        if self.stats:
+            self.stats.count('pairsMeasured',probes)
+            self.stats.count('corridorsCarved',len(corridors))
+        return self.connections
+
+    def carveCorridor(self,a,b,radius=1):
+        '''Opens every cell within radius (Chebyshev) of the straight line between tiles a and b.'''
+        steps = max(abs(b.y-a.y),abs(b.x-a.x),1)
+        if np is not None and isinstance(self.level,Grid):
+            t = np.arange(steps+1)
+            offsets = np.arange(-radius,radius+1)
+            ys = a.y + ((b.y-a.y)*t*2 + steps)//(2*steps)
+            xs = a.x + ((b.x-a.x)*t*2 + steps)//(2*steps)
+            Y = np.clip(ys[:,None,None] + offsets[None,:,None],0,self.h-1)
+            X = np.clip(xs[:,None,None] + offsets[None,None,:],0,self.w-1)
+            self.level.asArray()[np.broadcast_arrays(Y,X)] = 0
+            return
+        for t in range(steps+1):
+            y = a.y + ((b.y-a.y)*t*2 + steps)//(2*steps)
+            x = a.x + ((b.x-a.x)*t*2 + steps)//(2*steps)
+            for j in range(max(0,y-radius),min(self.h,y+radius+1)):
+                for i in range(max(0,x-radius),min(self.w,x+radius+1)):
+                    self.level[j][i] = False
+
+    def spawnTile(self):
+        '''The center when it is open, otherwise the tile nearest the middle of the largest cave.'''
+        if not self.level[self.center.y][self.center.x] or self.index is None or not len(self.index):
+            return self.center
+        return self.index.spawnTile(self.index.largest())
+
+    def calcDistances(self):
+        from DungeonPaths import distanceField,distanceTransform
+        self.clearance = distanceTransform(self.level)
+        self.spawnDistances = distanceField(self.level,[self.spawnTile()])
+
+    def pathFinder(self):
+        '''A DungeonPaths.PathFinder over the current level, for repeated A* queries.'''
+        from DungeonPaths import PathFinder
+        return PathFinder(self.level)
 
     def finalize(self):
+        if self.useNumpy and np is not None and isinstance(self.level,Grid):
+            opened = self.finalizeArray()
+        else:
+            opened = self.finalizeRows()
+        if self.stats: self.stats.count('cellsOpened',opened)
+
+    def finalizeRows(self):
+        '''finalize's pass in scan order, returning how many walls were opened.'''
+        #Opens every cell with open cells on both sides, up and down or left and right, counting out of bounds as walls (as orthSpecific does).
+        opened = 0
+        last = self.h-1
         for y,row in enumerate(self.level):
-            for x,_ in enumerate(row):
-                neighbors = self.orthSpecific(y,x)
-                if not (neighbors[0] or neighbors[1]) or not (neighbors[2] or neighbors[3]):
-                    self.level[y][x] = False
+            above = self.level[y-1] if y > 0 else None
+            below = self.level[y+1] if y < last else None
+            for x,wall in enumerate(row):
+                if not ((above is None or above[x]) or (below is None or below[x])) or not ((x == 0 or row[x-1]) or (x == self.w-1 or row[x+1])):
+                    if wall: opened += 1
+                    row[x] = False
+        return opened
 
 
 if __name__ == "__main__":
-    AutoCell = AutomaticCell(HEIGHT,WIDTH)
-    start = time.perf_counter()
-    level = AutoCell.GENERATE()
-    print(time.perf_counter() - start)
-    
-    I = Image.new('RGB',(WIDTH,HEIGHT),(255,255,255))
-    iD = ImageDraw.Draw(I)
-
-    walls = []
-    for y,row in enumerate(level):
-        for x,wall in enumerate(row):
-            if wall:
-                walls.append((x,y))
-    iD.point(walls,(0,0,0))
-
-    if DEBUG:
-        cavesWalls = []
-        for cave in AutoCell.cavesWalls:
-            for tile in cave:
-                cavesWalls.append((tile.x,tile.y))
-        AutoCell.caves = []
-        for y,row in enumerate(AutoCell.level):
-            for x,wall in enumerate(row):
-                if not wall: AutoCell.floodFill(y,x)
-        Caves = []
-        for cave in AutoCell.caves:
-            Cave = []
-            for tile in cave:
-                Cave.append((tile.x,tile.y))
-        iD.point(cavesWalls,(255,0,0))
-        for Cave in Caves:
-            iD.point(Cave,(random.randint(0,255),random.randint(0,255),random.randint(0,255)))
-        iD.point((AutoCell.center.x,AutoCell.center.y),(0,0,255))
-        print(f"Center Cave: {AutoCell.cavesReferences.get(AutoCell.center,'NONE')}")
-    I.show()
\ No newline at end of file
+    from DungeonCLI import main
+    main(['demo','--height',str(HEIGHT),'--width',str(WIDTH)] + (['--debug'] if DEBUG else []))
@@ -0,0 +1,118 @@
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class Grid:
+    '''Compact level storage, one byte per cell in a flat bytearray (index y*w+x).
+    Rows are memoryviews into the buffer, so level[y][x] reads and writes work like the old nested lists.
+    A second buffer of the same size lets simulation steps write the next generation and swap() without allocating.
+    The back buffer and the row views are only made on first use, so a grid that is only stored or handled through
+    view()/asArray() holds nothing but its h*w byte buffer.'''
+    def __init__(self,h,w,fill=0):
+        self.h = h
+        self.w = w
+        self.buffer = bytearray([fill])*(h*w)
+        self.rowViews = None    #Memoryviews of the rows of buffer, made by the first row access.
+        self.spare = None       #Back buffer, allocated by the first backBuffer, backRows or swap().
+        self.spareRows = None
+
+    @classmethod
+    def fromRows(cls,rows):
+        '''Builds a Grid from a nested list (or any sequence of rows) of truthy/falsy cells.'''
+        rows = list(rows)
+        grid = cls(len(rows),len(rows[0]) if rows else 0)
+        for y,row in enumerate(rows):
+            grid.rows[y][:] = bytes(1 if cell else 0 for cell in row)
+        return grid
+
+    def rowsOf(self,buffer):
+        view = memoryview(buffer)
+        return [view[y*self.w:(y+1)*self.w] for y in range(self.h)]
+
+    @property
+    def rows(self):
+        if self.rowViews is None: self.rowViews = self.rowsOf(self.buffer)
+        return self.rowViews
+
+    def __getitem__(self,y):
+        rows = self.rowViews
+        if rows is None: rows = self.rows
+        return rows[y]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return self.h
+
+    @property
+    def backBuffer(self):
+        if self.spare is None: self.spare = bytearray(self.h*self.w)
+        return self.spare
+
+    @property
+    def backRows(self):
+        if self.spareRows is None: self.spareRows = self.rowsOf(self.backBuffer)
+        return self.spareRows
+
+    def swap(self):
+        '''Makes the back buffer the current level. The old level becomes the back buffer and is overwritten by the next step.'''
+        self.buffer,self.spare = self.backBuffer,self.buffer
+        self.rowViews,self.spareRows = self.spareRows,self.rowViews
+
+    @classmethod
+    def fromPacked(cls,data,h,w):
+        '''Builds a Grid from bytes made by packLevel or Grid.pack.'''
+        grid = cls(h,w)
+        if np is not None:
+            bits = np.unpackbits(np.frombuffer(data,dtype=np.uint8).reshape(h,(w+7)//8),axis=1,count=w)
+            grid.asArray()[:] = bits
+            return grid
+        for y,row in enumerate(unpackLevel(data,h,w)):
+            grid.rows[y][:] = bytes(row)
+        return grid
+
+    def copy(self):
+        grid = Grid(self.h,self.w)
+        grid.buffer[:] = self.buffer
+        return grid
+
+    def tolist(self):
+        return [list(row) for row in self.rows]
+
+    def view(self):
+        '''Zero-copy, read-only 2D memoryview of the current level for exporters.'''
+        return memoryview(self.buffer).toreadonly().cast('B',(self.h,self.w))
+
+    def asArray(self,back=False):
+        '''Zero-copy (h,w) uint8 numpy view of the current level, or of the back buffer.'''
+        if np is None:
+            raise RuntimeError("Grid.asArray requires numpy to be installed.")
+        return np.frombuffer(self.backBuffer if back else self.buffer,dtype=np.uint8).reshape(self.h,self.w)
+
+    def pack(self):
+        '''Bit-packs the current level, see packLevel.'''
+        if np is not None:
+            return np.packbits(self.asArray(),axis=1).tobytes()
+        return packLevel(self)
+
+def asGrid(level):
+    '''Accepts a Grid, a nested list of rows or a 2D array and returns a Grid.'''
+    return level if isinstance(level,Grid) else Grid.fromRows(level)
+
+def packLevel(level):
+    '''Packs a level into bytes, one bit per cell with walls set. Rows are padded to whole bytes, most significant bit first.'''
+    packed = bytearray()
+    for row in level:
+        for start in range(0,len(row),8):
+            byte = 0
+            for wall in row[start:start+8]:
+                byte = byte << 1 | (1 if wall else 0)
+            packed.append(byte << (8 - len(row[start:start+8])))
+    return bytes(packed)
+
+def unpackLevel(data,h,w):
+    '''Unpacks bytes from packLevel back into a list of rows of bools.'''
+    stride = (w+7)//8
+    return [[bool(data[y*stride + x//8] >> (7 - x%8) & 1) for x in range(w)] for y in range(h)]
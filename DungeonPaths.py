@@ -0,0 +1,169 @@
+import heapq
+from array import array
+from collections import deque
+from DungeonGen3 import Tile,labelCaves
+from DungeonGrid import asGrid
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DIAGONAL = 2**0.5  #Cost factor of a diagonal step in dijkstraField.
+
+#Distance fields are flat arrays indexed y*w+x, like AutomaticCell.labels. With numpy, view one as an (h,w) array
+#without copying through np.frombuffer(field,dtype=np.int32).reshape(h,w).
+#Cells are 8-connected as in labelCaves, and everything outside the level counts as wall.
+
+OPEN = bytes([1]) + bytes(255)  #translate() table turning 0 into 1 and everything else into 0.
+
+def padded(level):
+    '''Open cells of a level as a flat bytearray with a one cell wall border, rows w+2 long.'''
+    h,w = level.h,level.w
+    cells = bytearray((h+2)*(w+2))
+    for y in range(h):
+        start = (y+1)*(w+2)+1
+        cells[start:start+w] = level.buffer[y*w:(y+1)*w].translate(OPEN)
+    return cells
+
+def spread(cells,w,dist,frontier):
+    '''Breadth first steps over the open cells of a padded level from frontier, whose dist entries are already set.
+    Fills dist (-1 for unreached cells) in place.'''
+    W = w+2
+    offsets = (-W-1,-W,-W+1,-1,1,W-1,W,W+1)
+    if np is not None:
+        passable = np.frombuffer(cells,dtype=np.uint8).astype(bool)
+        field = np.frombuffer(dist,dtype=np.int32)
+        frontier = np.array(frontier,dtype=np.int64)
+        steps = np.array(offsets)
+        d = 0
+        while frontier.size:
+            d += 1
+            n = (frontier[:,None] + steps).ravel()
+            n = n[(n >= 0) & (n < len(cells))]
+            n = np.unique(n[passable[n] & (field[n] < 0)])
+            field[n] = d
+            frontier = n
+        return
+    queue = deque(frontier)
+    while queue:
+        i = queue.popleft()
+        d = dist[i]+1
+        for offset in offsets:
+            n = i+offset
+            if 0 <= n < len(cells) and cells[n] and dist[n] < 0:
+                dist[n] = d
+                queue.append(n)
+
+def unpad(field,h,w,typecode='i'):
+    W = w+2
+    result = array(typecode)
+    for y in range(1,h+1):
+        result.extend(field[y*W+1:y*W+1+w])
+    return result
+
+def distanceField(level,sources):
+    '''Number of 8-connected steps from the nearest of sources (tiles) to every cell, -1 where none can be reached.
+    Sources on walls or outside the level are ignored.'''
+    level = asGrid(level)
+    h,w = level.h,level.w
+    cells = padded(level)
+    dist = array('i',[-1])*len(cells)
+    frontier = []
+    for y,x in sources:
+        i = (y+1)*(w+2)+x+1
+        if 0<=y<h and 0<=x<w and cells[i] and dist[i] < 0:
+            dist[i] = 0
+            frontier.append(i)
+    spread(cells,w,dist,frontier)
+    return unpad(dist,h,w)
+
+def distanceTransform(level):
+    '''Number of 8-connected steps from every open cell to the nearest wall, 0 on walls. Beyond the edge counts as wall,
+    so an open cell on the border is 1.'''
+    level = asGrid(level)
+    h,w = level.h,level.w
+    cells = padded(level)
+    dist = array('i',[-1])*len(cells)
+    if np is not None:
+        frontier = np.flatnonzero(np.frombuffer(cells,dtype=np.uint8) == 0)
+        np.frombuffer(dist,dtype=np.int32)[frontier] = 0
+    else:
+        frontier = [i for i,cell in enumerate(cells) if not cell]
+        for i in frontier: dist[i] = 0
+    spread(cells,w,dist,frontier)
+    return unpad(dist,h,w)
+
+def dijkstraField(level,sources,costs):
+    '''Cheapest cost from the nearest of sources to every cell, inf where none can be reached.
+    costs holds the cost of stepping onto each cell (flat, y*w+x); diagonal steps cost DIAGONAL times as much.'''
+    level = asGrid(level)
+    h,w = level.h,level.w
+    W = w+2
+    cells = padded(level)
+    dist = array('d',[float('inf')])*len(cells)
+    steps = [(offset,1.0) for offset in (-W,-1,1,W)] + [(offset,DIAGONAL) for offset in (-W-1,-W+1,W-1,W+1)]
+    queue = []
+    for y,x in sources:
+        i = (y+1)*W+x+1
+        if 0<=y<h and 0<=x<w and cells[i]:
+            dist[i] = 0.0
+            queue.append((0.0,i))
+    heapq.heapify(queue)
+    while queue:
+        d,i = heapq.heappop(queue)
+        if d > dist[i]: continue
+        for offset,factor in steps:
+            n = i+offset
+            if cells[n]:
+                y,x = divmod(n,W)
+                nd = d + costs[(y-1)*w+x-1]*factor
+                if nd < dist[n]:
+                    dist[n] = nd
+                    heapq.heappush(queue,(nd,n))
+    return unpad(dist,h,w,'d')
+
+class PathFinder:
+    '''Reusable A* queries over a finished level. The open areas are labelled once, so a target in another area is
+    rejected at once instead of after searching the whole start area.'''
+    def __init__(self,level,labels=None):
+        self.level = asGrid(level)
+        self.h,self.w = self.level.h,self.level.w
+        self.cells = padded(self.level)
+        self.labels = labels if labels is not None else labelCaves(self.level,self.h,self.w,1)[0]
+
+    def area(self,tile):
+        '''Label of the open area holding tile, -1 for walls and tiles outside the level.'''
+        y,x = tile
+        return self.labels[y*self.w+x] if 0<=y<self.h and 0<=x<self.w and not self.level.buffer[y*self.w+x] else -1
+
+    def reachable(self,start,goal):
+        return self.area(start) >= 0 and self.area(start) == self.area(goal)
+
+    def path(self,start,goal):
+        '''Shortest 8-connected path from start to goal as a list of Tiles, both included, or None if there is none.'''
+        if not self.reachable(start,goal): return None
+        W = self.w+2
+        cells = self.cells
+        offsets = (-W-1,-W,-W+1,-1,1,W-1,W,W+1)
+        begin,end = (start[0]+1)*W+start[1]+1,(goal[0]+1)*W+goal[1]+1
+        gy,gx = divmod(end,W)
+        came = {begin:None}
+        cost = {begin:0}
+        queue = [(0,0,begin)]
+        while queue:
+            _,d,i = heapq.heappop(queue)
+            if i == end: break
+            if d > cost[i]: continue
+            for offset in offsets:
+                n = i+offset
+                if cells[n] and d+1 < cost.get(n,d+2):
+                    cost[n] = d+1
+                    came[n] = i
+                    y,x = divmod(n,W)
+                    heapq.heappush(queue,(d+1+max(abs(y-gy),abs(x-gx)),d+1,n))
+        tiles = []
+        while end is not None:
+            y,x = divmod(end,W)
+            tiles.append(Tile(y-1,x-1))
+            end = came[end]
+        return tiles[::-1]
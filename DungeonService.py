@@ -0,0 +1,108 @@
+import asyncio
+from concurrent.futures import ProcessPoolExecutor,ThreadPoolExecutor
+from DungeonBatch import generateOne
+from DungeonCache import jobKey
+from DungeonGrid import Grid
+
+class GenerationService:
+    '''Asyncio front end to the generators: generate() runs generateOne on a bounded executor without blocking the event loop.
+    Concurrent requests for the same level share one computation. With queueLimit, at most that many computations are
+    running at once; further requests queue for a slot, or fail at once when block is False and queueLimit levels are already pending.
+    A computation nobody is waiting for any more is cancelled if it has not started yet; one that has started runs to the
+    end and keeps its slot until then, so cancelled requests never push more than queueLimit generations onto the executor.
+    processes=False runs generations on threads, which is cheaper to start but holds the GIL.'''
+    def __init__(self,workers=None,queueLimit=None,processes=True):
+        self.executor = (ProcessPoolExecutor if processes else ThreadPoolExecutor)(max_workers=workers)
+        self.queueLimit = queueLimit
+        self.slots = asyncio.Semaphore(queueLimit) if queueLimit else None
+        self.inFlight = {}  #Level key -> [task, number of callers waiting on it, executor future once it has a slot].
+        self.started = 0
+        self.coalesced = 0
+        self.cancelled = 0
+        self.rejected = 0
+
+    async def generate(self,seed,params,block=True):
+        '''Returns the level for a (seed,params) job, as generateOne takes it, as a fresh Grid.'''
+        #Unseeded levels differ every time, so each one gets a key of its own and never shares a job.
+        key = jobKey(seed,params) if seed is not None else object()
+        job = self.inFlight.get(key)
+        if job is None:
+            if not block and self.queueLimit and len(self.inFlight) >= self.queueLimit:
+                self.rejected += 1
+                raise RuntimeError(f"Generation queue is full ({self.queueLimit} levels).")
+            job = self.inFlight[key] = [None,0,None]
+            job[0] = asyncio.ensure_future(self.run(job,key,seed,params))
+        else:
+            self.coalesced += 1
+        job[1] += 1
+        try:
+            result = await asyncio.shield(job[0])
+        except asyncio.CancelledError:
+            if job[1] == 1 and not job[0].done() and self.cancel(job):
+                self.cancelled += 1
+                #Later requests for the same level must start a new job rather than join this dying one.
+                if self.inFlight.get(key) is job: del self.inFlight[key]
+            raise
+        finally:
+            job[1] -= 1
+        return Grid.fromPacked(result.data,result.h,result.w)
+
+    def cancel(self,job):
+        '''Cancels a job that is still waiting for a slot, or whose executor has not picked it up yet. Returns whether it was cancelled.'''
+        task,_,future = job
+        if future is None: return task.cancel()
+        return future.cancel()
+
+    async def run(self,job,key,seed,params):
+        try:
+            if self.slots: await self.slots.acquire()
+            loop = asyncio.get_running_loop()
+            try:
+                job[2] = self.executor.submit(generateOne,(seed,params))
+            except BaseException:
+                if self.slots: self.slots.release()
+                raise
+            self.started += 1
+            #The slot is held until the executor is done with the job, even if nobody waits for it any more.
+            if self.slots: job[2].add_done_callback(lambda _: self.release(loop))
+            return await asyncio.wrap_future(job[2])
+        finally:
+            if self.inFlight.get(key) is job: del self.inFlight[key]
+
+    def release(self,loop):
+        '''Frees a slot from an executor callback thread.'''
+        if not loop.is_closed(): loop.call_soon_threadsafe(self.slots.release)
+
+    def stats(self):
+        return {'inFlight':len(self.inFlight),'started':self.started,'coalesced':self.coalesced,
+                'cancelled':self.cancelled,'rejected':self.rejected}
+
+    def close(self,wait=False):
+        '''Shuts the executor down, dropping generations that have not started. With wait, blocks until running ones finish.'''
+        self.executor.shutdown(wait=wait,cancel_futures=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self,*exc):
+        #Waiting on a thread keeps the event loop free while running generations finish and the workers exit.
+        await asyncio.get_running_loop().run_in_executor(None,self.close,True)
+
+_service = None
+
+async def generate(seed,params):
+    '''Generates a level on a shared GenerationService with default settings, created on first use.'''
+    global _service
+    if _service is None: _service = GenerationService()
+    return await _service.generate(seed,params)
+
+
+if __name__ == "__main__":
+    import time
+    async def main():
+        async with GenerationService(workers=4,queueLimit=8) as service:
+            start = time.perf_counter()
+            #Every seed is asked for three times; each level is only generated once.
+            levels = await asyncio.gather(*(service.generate(seed%8,{'h':200,'w':200}) for seed in range(24)))
+            print(f"{len(levels)} levels in {time.perf_counter()-start:.2f}s {service.stats()}")
+    asyncio.run(main())
@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+class Phase:
+    '''One timed phase of a generation run.'''
+    def __init__(self,name):
+        self.name = name
+        self.seconds = 0.0
+        self.allocated = None  #Peak bytes allocated during the phase, when memory is traced.
+        self.counters = {}
+
+    def __repr__(self):
+        return f"Phase({self.name!r}, {self.seconds:.4f}s, {self.counters})"
+
+class GenerationStats:
+    '''Per-phase record of a generation run: wall time, memory allocated (with traceMemory) and counters.
+    Pass an instance to AutomaticCell.GENERATE. If hook is given it is called with each Phase as soon as it finishes.'''
+    def __init__(self,traceMemory=False,hook=None):
+        self.traceMemory = traceMemory
+        self.hook = hook
+        self.phases = []
+
+    @contextmanager
+    def phase(self,name):
+        current = Phase(name)
+        self.phases.append(current)
+        started = self.traceMemory and not tracemalloc.is_tracing()
+        if started: tracemalloc.start()
+        if self.traceMemory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield current
+        finally:
+            current.seconds = time.perf_counter() - start
+            if self.traceMemory:
+                current.allocated = tracemalloc.get_traced_memory()[1] - before
+            if started: tracemalloc.stop()
+            if self.hook: self.hook(current)
+
+    def count(self,name,amount=1):
+        '''Adds to a counter of the phase currently running.'''
+        counters = self.phases[-1].counters
+        counters[name] = counters.get(name,0) + amount
+
+    @property
+    def seconds(self):
+        return sum(phase.seconds for phase in self.phases)
+
+    def byPhase(self):
+        '''Seconds, peak allocation and counters summed over phases sharing a name, in first-run order.'''
+        totals = {}
+        for phase in self.phases:
+            total = totals.setdefault(phase.name,{'seconds':0.0,'allocated':None,'counters':{}})
+            total['seconds'] += phase.seconds
+            if phase.allocated is not None:
+                total['allocated'] = max(total['allocated'] or 0,phase.allocated)
+            for name,value in phase.counters.items():
+                total['counters'][name] = total['counters'].get(name,0) + value
+        return totals
+
+    def report(self):
+        lines = []
+        for name,total in self.byPhase().items():
+            memory = '' if total['allocated'] is None else f" {total['allocated']/1024:9.1f} KiB"
+            counters = ' '.join(f"{k}={v}" for k,v in total['counters'].items())
+            lines.append(f"{name:<14}{total['seconds']:9.4f}s{memory}  {counters}".rstrip())
+        lines.append(f"{'total':<14}{self.seconds:9.4f}s")
+        return '\n'.join(lines)
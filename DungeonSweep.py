@@ -0,0 +1,141 @@
+import os
+import time
+import itertools
+from collections import OrderedDict
+from DungeonGen3 import AutomaticCell,labelCaves
+
+#Tunables that decide the initial noise, and the simulation steps after it. The rest only matter from cleanup on.
+NOISE_PARAMS = ('initLive',)
+STEP_PARAMS = ('death','birth')
+#uncachedSeconds is the time a level took apart from the stages it reused from the cache, so it is not its full generation time.
+COLUMNS = ('seed','params','openRatio','caves','largestShare','uncachedSeconds','reusedSteps')
+
+class StageCache:
+    '''LRU memo of pipeline stages, each a level buffer (and random state) keyed by the seed and the tunables that
+    decided it, up to maxBytes of levels.'''
+    def __init__(self,maxBytes=256*2**20):
+        self.maxBytes = maxBytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self,key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self,key,level,state=None):
+        if key in self.entries or len(level) > self.maxBytes: return
+        self.entries[key] = (level,state)
+        self.bytes += len(level)
+        while self.bytes > self.maxBytes:
+            _,(evicted,_) = self.entries.popitem(last=False)
+            self.bytes -= len(evicted)
+
+def runConfig(seed,h,w,params,cache):
+    '''Generates one AutomaticCell level like GENERATE does, starting from the longest stage prefix found in cache.
+    Returns the level and how many simulation steps were reused.'''
+    cell = AutomaticCell(h,w,seed).configure(**params)
+    noiseKey = (seed,h,w) + tuple(getattr(cell,name) for name in NOISE_PARAMS)
+    stepKey = lambda k: noiseKey + tuple(getattr(cell,name) for name in STEP_PARAMS) + (k,)
+    steps = cell.sims-2
+    reused = 0
+    for k in range(steps,0,-1):
+        found = cache.get(stepKey(k))
+        if found:
+            cell.level.buffer[:],reused = found[0],k
+            cell.rng.setstate(found[1])
+            break
+    else:
+        found = cache.get(noiseKey)
+        if found:
+            cell.level.buffer[:] = found[0]
+            cell.rng.setstate(found[1])
+        else:
+            cell.setUpInitial()
+            cache.put(noiseKey,bytes(cell.level.buffer),cell.rng.getstate())
+    for k in range(reused+1,steps+1):
+        cell.level = cell.stepSimulate()
+        cache.put(stepKey(k),bytes(cell.level.buffer),cell.rng.getstate())
+    return cell.completeLevel(),reused
+
+def metrics(level,h,w):
+    '''Open ratio, number of open areas and the share of open cells in the largest one.'''
+    _,sizes = labelCaves(level,h,w,1)
+    opened = sum(sizes)
+    return {'openRatio':opened/(h*w),'caves':len(sizes),'largestShare':max(sizes)/opened if opened else 0.0}
+
+def runGroup(job):
+    '''Runs configurations sharing a seed, noise and step tunables, in order of sims so every run extends the last one's steps.'''
+    seed,h,w,configs,maxBytes = job
+    cache = StageCache(maxBytes)
+    rows = []
+    for params in sorted(configs,key=lambda params: params.get('sims',8)):
+        start = time.perf_counter()
+        level,reused = runConfig(seed,h,w,params,cache)
+        seconds = time.perf_counter()-start
+        rows.append(dict({'seed':seed,'params':params,'uncachedSeconds':seconds,'reusedSteps':reused},**metrics(level,h,w)))
+    return rows
+
+def configurations(grid,base=None):
+    '''Every combination of grid, a dict of tunable name -> list of values, over the base tunables.'''
+    names = list(grid)
+    return [dict(base or {},**dict(zip(names,values))) for values in itertools.product(*(grid[name] for name in names))]
+
+def sweep(seeds,grid,h=128,w=128,base=None,workers=None,maxBytes=256*2**20):
+    '''Generates an AutomaticCell level for every seed and combination of grid, returning one metrics row per level
+    (see COLUMNS), sorted by seed and then grid order. Configurations sharing a seed, initLive, death and birth run
+    in the same job and reuse each other's noise and simulation steps. When there are fewer such groups than workers,
+    the largest are split into runs of consecutive sims so every worker gets a job; each part then computes the steps
+    before its first configuration again.'''
+    seeds = list(seeds)
+    configs = configurations(grid,base)
+    prefixes = []
+    for params in configs:
+        settings = AutomaticCell(1,1).configure(**params)
+        prefixes.append(tuple(getattr(settings,name) for name in NOISE_PARAMS + STEP_PARAMS))
+    groups = {}
+    for seed in seeds:
+        for params,prefix in zip(configs,prefixes):
+            groups.setdefault((seed,)+prefix,[]).append(params)
+    workers = workers or os.cpu_count() or 1
+    parts = [sorted(group,key=lambda params: params.get('sims',8)) for group in groups.values()]
+    seedsOf = [prefix[0] for prefix in groups]
+    while len(parts) < workers:
+        largest = max(range(len(parts)),key=lambda i: len(parts[i]),default=None)
+        if largest is None or len(parts[largest]) < 2: break
+        group = parts[largest]
+        parts[largest:largest+1] = [group[:len(group)//2],group[len(group)//2:]]
+        seedsOf[largest:largest+1] = [seedsOf[largest]]*2
+    jobs = [(seed,h,w,part,maxBytes) for seed,part in zip(seedsOf,parts)]
+    workers = min(workers,len(jobs)) or 1
+    if workers == 1:
+        results = map(runGroup,jobs)
+    else:
+        from multiprocessing import Pool
+        with Pool(workers) as pool:
+            results = pool.map(runGroup,jobs)
+    order = {(seed,repr(params)):i for i,(seed,params) in enumerate(itertools.product(seeds,configs))}
+    return sorted((row for rows in results for row in rows),key=lambda row: order[(row['seed'],repr(row['params']))])
+
+def formatTable(rows,columns=COLUMNS):
+    '''Lays metrics rows out as an aligned text table.'''
+    def cell(value):
+        if isinstance(value,float): return f"{value:.3f}"
+        if isinstance(value,dict): return ' '.join(f"{k}={v}" for k,v in value.items())
+        return str(value)
+    table = [list(columns)] + [[cell(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[i]) for line in table) for i in range(len(columns))]
+    return '\n'.join('  '.join(text.ljust(width) for text,width in zip(line,widths)).rstrip() for line in table)
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    rows = sweep(range(2),{'initLive':[0.40,0.45],'sims':[4,6,8,10],'minCave':[30,50]},base={'useNumpy':True})
+    print(formatTable(rows))
+    print(f"{len(rows)} levels in {time.perf_counter()-start:.2f}s")
@@ -0,0 +1,83 @@
+import random
+from collections import OrderedDict
+from DungeonGen3 import AutomaticCell
+from DungeonGrid import Grid
+
+class ChunkedWorld:
+    '''Unbounded cave world, generated lazily in chunkSize x chunkSize chunks.
+    Starting noise is seeded per chunk from the world seed and chunk coordinates. Each chunk is simulated with a halo of
+    sims+1 cells of its neighbors' noise around it, so it comes out exactly like the same cells of any larger window of
+    the world simulated at once, as long as they are at least sims+1 cells from that window's edges.
+    Only the cellular automaton runs here; cave removal and connection need the whole level and are left out.'''
+    def __init__(self,seed,chunkSize=64,cacheChunks=16,**params):
+        self.seed = seed
+        self.chunkSize = chunkSize
+        self.cacheChunks = cacheChunks  #Number of noise chunks kept around for neighboring chunks to reuse.
+        self.noiseCache = OrderedDict()
+        self.params = params
+        self.settings = AutomaticCell(1,1).configure(**params)
+        self.halo = self.settings.sims+1  #Each simulation step reads one cell further out, and neighbors() already counts the window's column 0 as out of bounds.
+
+    def noise(self,cy,cx):
+        '''Starting live cells of one chunk, one byte per cell.'''
+        key = (cy,cx)
+        if key in self.noiseCache:
+            self.noiseCache.move_to_end(key)
+            return self.noiseCache[key]
+        rng = random.Random(f"{self.seed}/{cy}/{cx}")
+        initLive = self.settings.initLive
+        cells = bytes(1 if rng.random() < initLive else 0 for _ in range(self.chunkSize*self.chunkSize))
+        self.noiseCache[key] = cells
+        if len(self.noiseCache) > self.cacheChunks:
+            self.noiseCache.popitem(last=False)
+        return cells
+
+    def region(self,top,left,h,w):
+        '''Starting noise for an h x w window of world cells, stitched together from every chunk it overlaps.'''
+        C = self.chunkSize
+        level = Grid(h,w)
+        for cy in range(top//C,(top+h-1)//C+1):
+            for cx in range(left//C,(left+w-1)//C+1):
+                cells = self.noise(cy,cx)
+                y0,y1 = max(top,cy*C),min(top+h,(cy+1)*C)
+                x0,x1 = max(left,cx*C),min(left+w,(cx+1)*C)
+                for y in range(y0,y1):
+                    start = (y-cy*C)*C - cx*C
+                    level[y-top][x0-left:x1-left] = cells[start+x0:start+x1]
+        return level
+
+    def chunk(self,cy,cx):
+        '''Generates one chunk as a chunkSize x chunkSize Grid.'''
+        C,H = self.chunkSize,self.halo
+        size = C+2*H
+        cell = AutomaticCell(size,size).configure(**self.params)
+        cell.level = self.region(cy*C-H,cx*C-H,size,size)
+        for _ in range(cell.sims):
+            cell.level = cell.stepSimulate()
+        cell.close()
+        chunk = Grid(C,C)
+        for y in range(C):
+            chunk[y][:] = cell.level[y+H][H:H+C]
+        return chunk
+
+    def chunks(self,coords):
+        '''Lazily yields (cy,cx,chunk) for every chunk coordinate in coords, which may be an endless iterator such as spiral().'''
+        for cy,cx in coords:
+            yield cy,cx,self.chunk(cy,cx)
+
+def spiral(cy=0,cx=0):
+    '''Endless chunk coordinates, ring by ring outward from (cy,cx).'''
+    yield cy,cx
+    r = 1
+    while True:
+        for j in range(-r,r+1):
+            for i in (range(-r,r+1) if abs(j) == r else (-r,r)):
+                yield cy+j,cx+i
+        r += 1
+
+
+if __name__ == "__main__":
+    import itertools
+    world = ChunkedWorld('DOG',chunkSize=64)
+    for cy,cx,chunk in itertools.islice(world.chunks(spiral()),9):
+        print(cy,cx,sum(map(sum,chunk)))